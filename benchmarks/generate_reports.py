@@ -0,0 +1,135 @@
+"""
+Synthetic input generators for the benchmarks.
+
+Writes check-links reports in the format of the link crawler and matching
+panopto_recordings.csv files, so the pipeline can be measured offline at any size.
+"""
+import csv
+import random
+import uuid
+import argparse
+
+REPORT_COLUMNS = ['URL', 'Status Code', 'Content-Type', 'Parent URL', 'Input Line']
+RECORDINGS_COLUMNS = ['Name', 'ID', 'Duration', 'Folder', 'URL']
+
+PANOPTO_SERVER = 'https://southampton.cloud.panopto.eu'
+FOLDER_ID = 'fe0aa3a2-51e5-4231-becf-1306400b593b'
+
+# Share of learning object links of each type, by default
+DEFAULT_LO_MIX = {
+    'Panopto': 0.35,
+    'ThingLink': 0.15,
+    'Articulate': 0.15,
+    'Wordpress': 0.3,
+    'Powtoon': 0.05,
+}
+
+# URL templates for each LO type; {n} is a per-link number, {id} a Panopto session ID
+LO_URL_TEMPLATES = {
+    'Panopto': PANOPTO_SERVER + '/Panopto/Pages/Viewer.aspx?id={id}',
+    'ThingLink': 'https://www.thinglink.com/card/{n}',
+    'Articulate': 'https://rise.articulate.com/share/{n}#/',
+    'Wordpress': 'https://generic.wordpress.soton.ac.uk/page-{n}/',
+    'Powtoon': 'https://www.powtoon.com/online-presentation/{n}/',
+}
+
+# Status codes and their weights
+STATUS_CODES = [(200, 0.9), (404, 0.05), (301, 0.03), (500, 0.02)]
+
+CONTENT_TYPES = ['text/html; charset=UTF-8', 'text/html; charset=utf-8', 'application/pdf']
+
+def session_ids(count, seed=0):
+    """Deterministic Panopto session IDs."""
+    rng = random.Random(seed)
+    return [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(count)]
+
+def generate_panopto_recordings(path, sessions=200, seed=0):
+    """
+    Write a panopto_recordings.csv with the given number of sessions.
+
+    Args:
+        path (str): Output CSV path
+        sessions (int): Number of recordings
+        seed (int): Random seed; the same seed gives the same session IDs
+
+    Returns:
+        list: The session IDs written
+    """
+    ids = session_ids(sessions, seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(RECORDINGS_COLUMNS)
+        for i, session_id in enumerate(ids):
+            writer.writerow([
+                f'Recording {i}',
+                session_id,
+                f'00:{i % 60:02d}:{(i * 7) % 60:02d}',
+                FOLDER_ID,
+                f'{PANOPTO_SERVER}/Panopto/Pages/Viewer.aspx?id={session_id}',
+            ])
+    return ids
+
+def generate_check_links_report(path, rows=10_000, lo_fraction=0.05, lo_mix=None,
+                                panopto_hit_rate=0.5, catalog_ids=None, pages=500, seed=0):
+    """
+    Write a synthetic check-links report.
+
+    Args:
+        path (str): Output CSV path
+        rows (int): Number of links in the report
+        lo_fraction (float): Share of links that are learning objects
+        lo_mix (dict): Share of each LO type among the learning objects
+        panopto_hit_rate (float): Share of Panopto links whose ID is in catalog_ids
+        catalog_ids (list): Session IDs of the matching panopto_recordings.csv
+        pages (int): Number of distinct parent pages
+        seed (int): Random seed
+    """
+    rng = random.Random(seed)
+    lo_mix = lo_mix or DEFAULT_LO_MIX
+    lo_types = list(lo_mix)
+    lo_weights = [lo_mix[lo_type] for lo_type in lo_types]
+    codes = [code for code, _ in STATUS_CODES]
+    code_weights = [weight for _, weight in STATUS_CODES]
+    catalog_ids = catalog_ids or []
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_COLUMNS)
+        for line in range(1, rows + 1):
+            if rng.random() < lo_fraction:
+                lo_type = rng.choices(lo_types, lo_weights)[0]
+                if catalog_ids and rng.random() < panopto_hit_rate:
+                    session_id = rng.choice(catalog_ids)
+                else:
+                    session_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+                url = LO_URL_TEMPLATES[lo_type].format(n=rng.randrange(10 ** 9), id=session_id)
+            else:
+                url = f'https://www.example.ac.uk/resource/{rng.randrange(10 ** 9)}'
+            writer.writerow([
+                url,
+                rng.choices(codes, code_weights)[0],
+                rng.choice(CONTENT_TYPES),
+                f'https://library.soton.ac.uk/guide-{rng.randrange(pages)}',
+                line,
+            ])
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark inputs.")
+    parser.add_argument('--rows', type=int, default=10_000, help="Links in the check-links report")
+    parser.add_argument('--sessions', type=int, default=200, help="Recordings in panopto_recordings.csv")
+    parser.add_argument('--lo-fraction', type=float, default=0.05, help="Share of links that are LOs")
+    parser.add_argument('--panopto-hit-rate', type=float, default=0.5,
+                        help="Share of Panopto links that match a recording")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', default='check-links-report-2000-01-01.csv')
+    parser.add_argument('--recordings', default='panopto_recordings.csv')
+    args = parser.parse_args()
+
+    ids = generate_panopto_recordings(args.recordings, args.sessions, args.seed)
+    generate_check_links_report(args.report, args.rows, args.lo_fraction,
+                                panopto_hit_rate=args.panopto_hit_rate,
+                                catalog_ids=ids, seed=args.seed)
+    print(f"Wrote {args.report} ({args.rows} rows) and {args.recordings} ({args.sessions} sessions)")
+
+if __name__ == "__main__":
+    main()
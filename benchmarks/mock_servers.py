@@ -0,0 +1,277 @@
+"""
+Local mock servers for the benchmarks, so the network code runs offline.
+
+MockPanoptoServer serves /Panopto/api/v1/folders/{id}, /folders/{id}/children,
+/folders/{id}/sessions and /sessions/{id}/viewers, and can inject throttling
+and server errors; MockGitHubServer serves the reports listing and the raw
+report files used by download_latest_report; MockLinkServer serves pages
+with given statuses for the link re-checks.
+"""
+import re
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from generate_reports import session_ids
+
+class _MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, latency=0.0):
+        super().__init__(('127.0.0.1', 0), handler)
+        # Seconds added to every response, to model network round trips
+        self.latency = latency
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment, flushed after each request,
+    # so Nagle's algorithm and delayed ACKs do not add to every round trip
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload, status=200):
+        self.send_body(status, json.dumps(payload).encode('utf-8'), {'Content-Type': 'application/json'})
+
+    def begin(self):
+        with self.server.lock:
+            self.server.request_count += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+class MockPanoptoServer(_MockServer):
+    """
+    Mock Panopto REST API with a tree of folders of generated sessions.
+
+    The root folder is 'mock-folder'. With depth > 0, every folder above the
+    given depth has child_folders subfolders, and every folder holds the same
+    number of sessions.
+
+    Args:
+        sessions (int): Number of sessions in each folder
+        viewers (int): Number of viewer records per session
+        latency (float): Seconds of delay per request
+        max_page_size (int): Largest pageSize honoured by the listings
+        child_folders (int): Subfolders of each folder above the given depth
+        depth (int): Levels of subfolders below the root
+        rate_limit (float): Requests per second allowed before answering 429 with a
+            Retry-After, or None for no limit
+        error_every (int): Answer every nth request with a 503, or 0 for never
+    """
+    def __init__(self, sessions=500, viewers=5, latency=0.0, max_page_size=50, child_folders=0, depth=0,
+                 rate_limit=None, error_every=0):
+        super().__init__(_PanoptoHandler, latency)
+        self.viewers = viewers
+        self.max_page_size = max_page_size
+        self.rate_limit = rate_limit
+        self.error_every = error_every
+        # Token bucket of the rate limit, holding up to one second of requests
+        self.allowance = rate_limit or 0
+        self.allowance_updated = time.monotonic()
+        self.throttled_count = 0
+        self.error_count = 0
+        # Folder ID -> (name, child folder IDs, sessions)
+        self.folders = {}
+        self._add_folder('mock-folder', 'Mock folder', sessions, child_folders, depth)
+
+    def throttle(self):
+        """
+        Decide whether to refuse the current request.
+
+        Returns:
+            tuple: (status, Retry-After seconds) to refuse with, or None to serve it
+        """
+        with self.lock:
+            if self.error_every and self.request_count % self.error_every == 0:
+                self.error_count += 1
+                return 503, None
+            if self.rate_limit:
+                now = time.monotonic()
+                self.allowance = min(self.rate_limit,
+                                     self.allowance + (now - self.allowance_updated) * self.rate_limit)
+                self.allowance_updated = now
+                if self.allowance < 1:
+                    self.throttled_count += 1
+                    return 429, (1 - self.allowance) / self.rate_limit
+                self.allowance -= 1
+        return None
+
+    @property
+    def sessions(self):
+        """Sessions of the root folder."""
+        return self.folders['mock-folder'][2]
+
+    def _add_folder(self, folder_id, name, sessions, child_folders, depth):
+        seed = len(self.folders)
+        self.folders[folder_id] = (name, [], [
+            {'Id': session_id, 'Name': f'Recording {i}', 'Duration': 60.0 * (i % 90),
+             'Folder': folder_id}
+            for i, session_id in enumerate(session_ids(sessions, seed))
+        ])
+        if depth > 0:
+            for i in range(child_folders):
+                child_id = f'{folder_id}-{i}'
+                self.folders[folder_id][1].append(child_id)
+                self._add_folder(child_id, f'{name} {i}', sessions, child_folders, depth - 1)
+
+class _PanoptoHandler(_Handler):
+    folder_path = re.compile(r'^/Panopto/api/v1/folders/([^/]+)(/children|/sessions)?$')
+    viewers_path = re.compile(r'^/Panopto/api/v1/sessions/([^/]+)/viewers$')
+
+    def send_page(self, items, query):
+        page_number = int(query.get('pageNumber', ['0'])[0])
+        page_size = min(int(query.get('pageSize', ['50'])[0]), self.server.max_page_size)
+        start = page_number * page_size
+        self.send_json({'Results': items[start:start + page_size]})
+
+    def do_GET(self):
+        self.begin()
+        refusal = self.server.throttle()
+        if refusal:
+            status, retry_after = refusal
+            # Fractional seconds, so the benchmarks do not wait whole seconds
+            headers = {'Retry-After': f'{retry_after:.3f}'} if retry_after is not None else {}
+            return self.send_body(status, b'', headers)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        folder_match = self.folder_path.match(url.path)
+        if folder_match and folder_match.group(1) in self.server.folders:
+            folder_id, listing = folder_match.groups()
+            name, children, sessions = self.server.folders[folder_id]
+            if listing == '/sessions':
+                self.send_page(sessions, query)
+            elif listing == '/children':
+                self.send_page([{'Id': child, 'Name': self.server.folders[child][0]} for child in children], query)
+            else:
+                self.send_json({'Id': folder_id, 'Name': name})
+        elif self.viewers_path.match(url.path):
+            self.send_json({'Results': [
+                {'Id': f'user-{i}', 'Name': f'Viewer {i}'} for i in range(self.server.viewers)
+            ]})
+        else:
+            self.send_json({'Error': 'Not found'}, status=404)
+
+class MockGitHubServer(_MockServer):
+    """
+    Mock of the GitHub contents API and raw file host for the reports directory.
+    Responses carry ETags and honour If-None-Match and byte ranges.
+
+    Args:
+        files (dict): Report file name -> bytes
+        latency (float): Seconds of delay per request
+    """
+    def __init__(self, files, latency=0.0):
+        super().__init__(_GitHubHandler, latency)
+        self.files = files
+
+    @property
+    def api_url(self):
+        return f'{self.url}/repos/unisotonlibrary/link-crawler/contents/reports'
+
+    @property
+    def raw_url_template(self):
+        return f'{self.url}/raw/reports/{{filename}}'
+
+class _GitHubHandler(_Handler):
+    def do_GET(self):
+        self.begin()
+        path = urlparse(self.path).path
+        if path.startswith('/repos/'):
+            body = json.dumps([{'name': name} for name in self.server.files]).encode('utf-8')
+        elif path.startswith('/raw/reports/') and path.rsplit('/', 1)[1] in self.server.files:
+            body = self.server.files[path.rsplit('/', 1)[1]]
+        else:
+            return self.send_json({'message': 'Not Found'}, status=404)
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            return self.send_body(304, b'', {'ETag': etag})
+        byte_range = self.headers.get('Range')
+        if byte_range and self.headers.get('If-Range') in (None, etag):
+            start = int(byte_range.split('=')[1].split('-')[0])
+            if start >= len(body):
+                return self.send_body(416, b'')
+            return self.send_body(206, body[start:], {
+                'ETag': etag,
+                'Content-Range': f'bytes {start}-{len(body) - 1}/{len(body)}',
+            })
+        self.send_body(200, body, {'ETag': etag})
+
+class MockLinkServer(_MockServer):
+    """
+    Mock web site for link checks. /status/{code} answers with that status,
+    /redirect/{code} redirects to /status/{code} and /no-head/{code} refuses
+    HEAD requests with a 405 but answers GET with the status. Anything else
+    is a 404. The most requests served at once is kept in max_concurrent.
+
+    Args:
+        latency (float): Seconds of delay per request
+    """
+    def __init__(self, latency=0.0):
+        super().__init__(_LinkHandler, latency)
+        self.active = 0
+        self.max_concurrent = 0
+        self.methods = {}
+
+class _LinkHandler(_Handler):
+    link_path = re.compile(r'^/(status|redirect|no-head)/(\d{3})$')
+
+    def respond(self, method):
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_concurrent = max(self.server.max_concurrent, self.server.active)
+            self.server.methods[method] = self.server.methods.get(method, 0) + 1
+        try:
+            self.begin()
+            match = self.link_path.match(urlparse(self.path).path)
+            if not match:
+                return self.send_body(404, b'')
+            kind, status = match.group(1), int(match.group(2))
+            if kind == 'redirect':
+                return self.send_body(301, b'', {'Location': f'/status/{status}'})
+            if kind == 'no-head' and method == 'HEAD':
+                return self.send_body(405, b'')
+            body = b'' if method == 'HEAD' else b'<html></html>'
+            # HEAD gets the headers of a GET, without the body
+            self.send_response(status)
+            self.send_header('Content-Length', '13')
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def do_HEAD(self):
+        self.respond('HEAD')
+
+    def do_GET(self):
+        self.respond('GET')
@@ -0,0 +1,340 @@
+"""
+Benchmarks for the hot paths of both pipelines, run entirely offline.
+
+Measures throughput and peak memory of process_learning_objects (with both
+engines), stream_learning_objects, the cold start of a small monthly run,
+download_latest_report,
+PanoptoClient.get_folder_contents (also against a throttling server),
+PanoptoClient.crawl_folder_tree and the link re-checks of LinkChecker against
+synthetic inputs and local mock servers, and compares them with the recorded baselines in baselines.json.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+import contextlib
+import importlib
+import importlib.util
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+BASELINES_FILE = os.path.join(BENCHMARK_DIR, 'baselines.json')
+# Peak memory rises smaller than this (MB) are not regressions: the resident set
+# grows a page at a time, so a few MB is noise for the small network scenarios
+PEAK_MB_FLOOR = 5.0
+
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from generate_reports import generate_check_links_report, generate_panopto_recordings
+from mock_servers import MockPanoptoServer, MockGitHubServer, MockLinkServer
+from link_checker import LinkChecker
+
+def load_script(file_name):
+    """Import one of the repository's scripts, whose file names are not valid module names."""
+    name = os.path.splitext(file_name)[0].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def rss_mb():
+    """Resident set size of this process in MB, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+class RSSSampler(threading.Thread):
+    """Samples the resident set size in the background and keeps the peak."""
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.start_mb = rss_mb()
+        self.peak_mb = self.start_mb
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.peak_mb = max(self.peak_mb, rss_mb())
+        return self.peak_mb - self.start_mb
+
+def measure(func, *args, **kwargs):
+    """
+    Run func with its output silenced.
+
+    Peak memory is the larger of the peak traced by tracemalloc and the growth
+    of the resident set size, since Arrow-backed pandas columns are allocated
+    outside the Python allocator.
+
+    Returns:
+        tuple: (result, seconds, peak memory in MB)
+    """
+    sampler = RSSSampler() if rss_mb() is not None else None
+    if sampler:
+        sampler.start()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        rss_growth = sampler.stop() if sampler else 0
+    return result, seconds, max(peak / 2 ** 20, rss_growth)
+
+def bench_process(lo_data, rows, workdir):
+    """process_learning_objects and the streaming mode over a synthetic report."""
+    report = os.path.join(workdir, 'reports', f'check-links-report-bench-{rows}.csv')
+    recordings = os.path.join(workdir, 'reports', 'panopto_recordings.csv')
+    ids = generate_panopto_recordings(recordings, sessions=500)
+    generate_check_links_report(report, rows=rows, catalog_ids=ids)
+    size_mb = os.path.getsize(report) / 2 ** 20
+
+    results = {}
+    _, seconds, peak = measure(lo_data.process_learning_objects, report, recordings)
+    results[f'process_learning_objects[{rows}]'] = {
+        'seconds': seconds, 'rows_per_second': rows / seconds, 'peak_mb': peak, 'input_mb': size_mb}
+    _, seconds, peak = measure(lo_data.stream_learning_objects, report, recordings, chunksize=50_000)
+    results[f'stream_learning_objects[{rows}]'] = {
+        'seconds': seconds, 'rows_per_second': rows / seconds, 'peak_mb': peak, 'input_mb': size_mb}
+    _, seconds, peak = measure(lo_data.lite_process_learning_objects, report, recordings)
+    results[f'lite_process_learning_objects[{rows}]'] = {
+        'seconds': seconds, 'rows_per_second': rows / seconds, 'peak_mb': peak, 'input_mb': size_mb}
+    return results
+
+def bench_cold_start(rows, workdir, runs=3):
+    """
+    A whole `lo.py data` run in a new interpreter, with each engine, over a
+    small report as in a monthly run. GitHub is replayed offline from an empty
+    cache, so the local report is used.
+    """
+    rundir = os.path.join(workdir, 'cold-start')
+    os.makedirs(os.path.join(rundir, 'reports'))
+    ids = generate_panopto_recordings(os.path.join(rundir, 'reports', 'panopto_recordings.csv'), sessions=200)
+    generate_check_links_report(os.path.join(rundir, 'reports', 'check-links-report-2000-01-01.csv'),
+                                rows=rows, catalog_ids=ids)
+    results = {}
+    for engine in ('lite', 'pandas'):
+        command = [sys.executable, os.path.join(REPO_DIR, 'lo.py'), 'data', '--engine', engine, '--offline',
+                   '--cache-dir', os.path.join(rundir, 'empty-cache'), '--no-metrics']
+        best = None
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=rundir, check=True, capture_output=True)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        results[f'cold_start[{rows},{engine}]'] = {'seconds': best, 'runs_per_second': 1 / best}
+    return results
+
+def bench_download(lo_data, rows, workdir):
+    """download_latest_report: a first download and a repeat run that should cost one 304, for the listing."""
+    report = os.path.join(workdir, 'source-report.csv')
+    generate_check_links_report(report, rows=rows)
+    with open(report, 'rb') as f:
+        body = f.read()
+    os.remove(report)
+
+    results = {}
+    with MockGitHubServer({'check-links-report-2000-01-01.csv': body}, latency=0.005) as server:
+        lo_data.GITHUB_API_URL = server.api_url
+        lo_data.RAW_URL_TEMPLATE = server.raw_url_template
+        (path, downloaded), seconds, peak = measure(lo_data.download_latest_report)
+        assert downloaded, "benchmark download failed"
+        results[f'download_latest_report[{rows}]'] = {
+            'seconds': seconds, 'mb_per_second': len(body) / 2 ** 20 / seconds, 'peak_mb': peak}
+        requests_before = server.request_count
+        _, seconds, peak = measure(lo_data.download_latest_report)
+        results[f'download_latest_report_repeat[{rows}]'] = {
+            'seconds': seconds, 'requests': server.request_count - requests_before, 'peak_mb': peak}
+    return results
+
+class StaticToken:
+    """Token provider for the mock Panopto server, which does not check tokens."""
+    def get_access_token(self, force_refresh=False):
+        return 'benchmark'
+
+def bench_panopto(panopto_client, sessions, latency, workers, include_viewers=True):
+    """PanoptoClient.get_folder_contents against the mock Panopto server."""
+    with MockPanoptoServer(sessions=sessions, latency=latency) as server:
+        with contextlib.redirect_stdout(io.StringIO()):
+            client = panopto_client.PanoptoClient(server.url, 'benchmark', 'benchmark', max_workers=workers,
+                                                  token_provider=StaticToken())
+        recordings, seconds, peak = measure(client.get_folder_contents, 'mock-folder', include_viewers)
+        assert len(recordings) == sessions, "benchmark listing was truncated"
+        name = f'workers={workers}' if include_viewers else 'pages_only'
+        return {f'get_folder_contents[{sessions},{name}]': {
+            'seconds': seconds, 'sessions_per_second': sessions / seconds,
+            'requests': server.request_count, 'peak_mb': peak}}
+
+def bench_throttled(panopto_client, sessions, latency, rate_limit, error_every=25):
+    """
+    PanoptoClient.get_folder_contents with viewers against a mock server that
+    answers 429 above rate_limit requests per second and 503 to every
+    error_every-th request. The listing must still be complete.
+    """
+    with MockPanoptoServer(sessions=sessions, latency=latency, rate_limit=rate_limit,
+                           error_every=error_every) as server:
+        with contextlib.redirect_stdout(io.StringIO()):
+            client = panopto_client.PanoptoClient(server.url, 'benchmark', 'benchmark', max_workers=8,
+                                                  token_provider=StaticToken())
+            # Short backoff, so the injected errors do not dominate the timing
+            client.session.backoff = 0.05
+        recordings, seconds, peak = measure(client.get_folder_contents, 'mock-folder', True)
+        assert len(recordings) == sessions, "benchmark listing was truncated"
+        served = server.request_count - server.throttled_count - server.error_count
+        return {f'get_folder_contents_throttled[{sessions},limit={rate_limit}]': {
+            'seconds': seconds, 'sessions_per_second': sessions / seconds,
+            'served_requests_per_second': served / seconds, 'peak_mb': peak}}
+
+def bench_folder_tree(panopto_client, sessions, latency, workers, folder_workers):
+    """PanoptoClient.crawl_folder_tree over a mock tree of 1 + 4 + 16 folders."""
+    with MockPanoptoServer(sessions=sessions, latency=latency, child_folders=4, depth=2) as server:
+        with contextlib.redirect_stdout(io.StringIO()):
+            client = panopto_client.PanoptoClient(server.url, 'benchmark', 'benchmark', max_workers=workers,
+                                                  token_provider=StaticToken())
+        crawl = lambda: sum(len(page) for page in client.crawl_folder_tree('mock-folder', folder_workers,
+                                                                            include_viewers=True))
+        total, seconds, peak = measure(crawl)
+        assert total == sessions * len(server.folders), "benchmark crawl was truncated"
+        return {f'crawl_folder_tree[{len(server.folders)}x{sessions},folder_workers={folder_workers}]': {
+            'seconds': seconds, 'sessions_per_second': total / seconds,
+            'requests': server.request_count, 'peak_mb': peak}}
+
+def bench_recheck(links, latency, hosts=4, per_host=2):
+    """
+    LinkChecker.check over links spread across several mock sites, with some
+    broken, redirected and HEAD-refusing links. Every site must see at most
+    per_host requests at once, and each URL must be checked once.
+    """
+    servers = [MockLinkServer(latency=latency) for _ in range(hosts)]
+    kinds = ['/status/200'] * 7 + ['/status/404', '/redirect/200', '/no-head/200']
+    urls = [f'{servers[i % hosts].url}{kinds[i % len(kinds)]}?link={i}' for i in range(links)]
+    with contextlib.ExitStack() as stack:
+        for server in servers:
+            stack.enter_context(server)
+        checker = LinkChecker(max_workers=16, per_host=per_host)
+        # Each link appears on two pages
+        statuses, seconds, peak = measure(checker.check, urls + urls)
+        assert len(statuses) == links and set(statuses.values()) == {200, 404}, "benchmark re-check failed"
+        assert max(server.max_concurrent for server in servers) <= per_host, "per-host limit exceeded"
+        return {f'recheck_links[{links},hosts={hosts}]': {
+            'seconds': seconds, 'links_per_second': links / seconds,
+            'requests': sum(server.request_count for server in servers), 'peak_mb': peak}}
+
+def compare(results, baselines, tolerance, peak_floor=PEAK_MB_FLOOR):
+    """
+    Compare results with the baselines.
+
+    A scenario regresses if any throughput metric (*_per_second) falls below
+    (1 - tolerance) of its baseline, or its peak memory or request count rises
+    above (1 + tolerance) of the baseline. Peak memory must also rise by more
+    than peak_floor MB.
+
+    Returns:
+        list: Descriptions of the regressions found
+    """
+    regressions = []
+    for name, metrics in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        for metric, value in metrics.items():
+            if metric not in baseline:
+                continue
+            expected = baseline[metric]
+            if metric.endswith('_per_second') and value < expected * (1 - tolerance):
+                regressions.append(f"{name} {metric}: {value:.1f} < baseline {expected:.1f}")
+            elif metric == 'peak_mb' and value - expected <= peak_floor:
+                continue
+            elif metric in ('peak_mb', 'requests') and value > expected * (1 + tolerance):
+                regressions.append(f"{name} {metric}: {value:.1f} > baseline {expected:.1f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000],
+                        help="Report sizes to benchmark (10k to 10M)")
+    parser.add_argument('--sessions', type=int, default=500, help="Sessions in the mock Panopto folder")
+    parser.add_argument('--latency', type=float, default=0.01, help="Mock server latency in seconds")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8],
+                        help="PanoptoClient worker counts to benchmark")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Allowed relative change from the baselines before reporting a regression")
+    parser.add_argument('--peak-floor', type=float, default=PEAK_MB_FLOOR,
+                        help="Peak memory rises (MB) too small to report as a regression")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--update-baselines', action='store_true', help="Record these results as the baselines")
+    args = parser.parse_args()
+
+    lo_data = load_script('learning-object-data.py')
+    panopto_client = load_script('panopto-client.py')
+    # learning-object-data.py imports pandas on first use; keep that out of the timings
+    importlib.import_module('pandas')
+
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # The pipeline reads and writes reports/ and tables/ relative to the working directory
+        os.chdir(workdir)
+        try:
+            os.makedirs('reports')
+            for rows in args.rows:
+                results.update(bench_process(lo_data, rows, workdir))
+            results.update(bench_cold_start(500, workdir))
+            results.update(bench_download(lo_data, args.rows[0], workdir))
+            for workers in args.workers:
+                results.update(bench_panopto(panopto_client, args.sessions, args.latency, workers))
+            results.update(bench_panopto(panopto_client, args.sessions, args.latency, 1, include_viewers=False))
+            results.update(bench_throttled(panopto_client, args.sessions, args.latency, rate_limit=200))
+            for folder_workers in (1, 4):
+                results.update(bench_folder_tree(panopto_client, 50, args.latency, 8, folder_workers))
+            results.update(bench_recheck(400, args.latency))
+        finally:
+            os.chdir(cwd)
+
+    for name, metrics in results.items():
+        print(name + ': ' + ', '.join(f'{metric}={value:.2f}' for metric, value in metrics.items()))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baselines:
+        baselines = {}
+        if os.path.exists(BASELINES_FILE):
+            with open(BASELINES_FILE, encoding='utf-8') as f:
+                baselines = json.load(f)
+        baselines.update(results)
+        with open(BASELINES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baselines updated in {BASELINES_FILE}")
+        return
+
+    if os.path.exists(BASELINES_FILE):
+        with open(BASELINES_FILE, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.peak_floor)
+        if regressions:
+            print("\nRegressions against the baselines:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baselines")
+
+if __name__ == "__main__":
+    main()
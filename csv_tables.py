@@ -0,0 +1,219 @@
+#!python3
+import re
+import csv
+import json
+
+# Strings pandas.read_csv reads as missing values by default
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+# Strings pandas.read_csv reads as booleans
+BOOL_VALUES = frozenset(['True', 'False', 'TRUE', 'FALSE', 'true', 'false'])
+
+# Integers that pandas writes back unchanged: int64, no '+', no leading zeros
+INT_PATTERN = re.compile(r'0|-?[1-9]\d{0,17}')
+# Any other value pandas could read as a number, e.g. 1.5, 007, +3, 1e3 or inf
+NUMBER_PATTERN = re.compile(r'\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|inf(?:inity)?)\s*', re.IGNORECASE)
+
+class UnsupportedCSV(ValueError):
+    '''
+    Raised for CSV data that this module cannot type exactly as pandas.read_csv
+    would, e.g. floats or booleans, so the caller can fall back to pandas.
+    '''
+
+def parser_chunk_rows(width):
+    '''
+    Rows in each chunk of pandas' C parser for a table of the given width. In
+    its default low_memory mode it infers column types chunk by chunk.
+    '''
+    heuristic = 2 ** 20 // max(width, 1)
+    rows = 1
+    while rows * 2 < heuristic:
+        rows *= 2
+    return rows
+
+def iter_csv(path):
+    '''
+    Yield the header of a CSV file, then its rows, as pandas.read_csv splits
+    them: blank lines are skipped, NA_VALUES become None and short rows are
+    padded with None. Values are left as strings for ColumnTypes to type.
+    '''
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        try:
+            header = next((row for row in reader if row), None)
+            if header is None:
+                raise UnsupportedCSV(f"{path} has no header")
+            if '' in header or len(set(header)) < len(header):
+                raise UnsupportedCSV(f"{path} has blank or duplicate column names")
+            yield header
+
+            width = len(header)
+            padding = [None] * width
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) > width or (len(row) == 1 < width and not row[0].strip()):
+                    raise UnsupportedCSV(f"{path} line {reader.line_num} does not fit the header")
+                row = [None if value in NA_VALUES else value for value in row]
+                yield row + padding[len(row):] if len(row) < width else row
+        except csv.Error as e:
+            raise UnsupportedCSV(f"{path}: {str(e)}")
+
+class ColumnTypes():
+    '''
+    Infers the type pandas.read_csv gives each column from the rows of
+    iter_csv, one row at a time.
+
+    A column is 'int' if every value is an integer, 'float' if it also has
+    missing values (which pandas writes back as e.g. 200.0), 'empty' if every
+    value is missing, and 'str' otherwise, keeping the values as they are.
+    Columns in raw are always 'str', as with dtype='str'. Values pandas would
+    rewrite (e.g. 1.50 or TRUE) raise UnsupportedCSV, as does a column mixing
+    numbers and text across parser chunks, which pandas types chunk by chunk.
+    The chunks depend on the width of the file, which is given if only some of
+    its columns are typed.
+    '''
+    def __init__(self, columns, raw=(), width=None):
+        self.columns = columns
+        self.raw = set(raw)
+        self.width = width or len(columns)
+        self.rows = 0
+        # Per column: missing, integer, other numeric, boolean and text values
+        self.counts = [[0, 0, 0, 0, 0] for _ in columns]
+        # Columns still being typed; raw columns and ones already mixed need no more checks
+        self.pending = [i for i, column in enumerate(columns) if column not in self.raw]
+
+    def add(self, row):
+        self.rows += 1
+        settled = False
+        for i in self.pending:
+            counts = self.counts[i]
+            value = row[i]
+            if value is None:
+                counts[0] += 1
+            elif INT_PATTERN.fullmatch(value):
+                counts[1] += 1
+            elif NUMBER_PATTERN.fullmatch(value):
+                counts[2] += 1
+            elif value in BOOL_VALUES:
+                counts[3] += 1
+            else:
+                counts[4] += 1
+            settled = settled or (counts[4] and (counts[1] or counts[2] or counts[3]))
+        if settled:
+            self.pending = [i for i in self.pending
+                            if not (self.counts[i][4] and any(self.counts[i][1:4]))]
+
+    def kinds(self):
+        '''
+        Kind of each column: 'int', 'float', 'empty' or 'str'.
+        '''
+        kinds = []
+        chunk_rows = parser_chunk_rows(self.width)
+        for column, (missing, ints, numbers, bools, text) in zip(self.columns, self.counts):
+            if column in self.raw:
+                kinds.append('str')
+            elif text or (bools and (ints or numbers)):
+                if (ints or numbers or bools) and self.rows > chunk_rows:
+                    raise UnsupportedCSV(f"Column {column} mixes numbers and text across parser chunks")
+                kinds.append('str')
+            elif numbers or bools:
+                raise UnsupportedCSV(f"Column {column} has values pandas would rewrite")
+            elif ints:
+                kinds.append('float' if missing else 'int')
+            else:
+                kinds.append('empty')
+        return kinds
+
+def typed(kinds, row):
+    '''
+    Convert a row of iter_csv to the values pandas would hold for the given kinds.
+    '''
+    return [
+        None if value is None or kind == 'empty' else
+        int(value) if kind == 'int' else
+        float(value) if kind == 'float' else value
+        for kind, value in zip(kinds, row)
+    ]
+
+class Table():
+    '''
+    A table of typed rows (int, float, str or None values), as read by read_csv.
+    '''
+    def __init__(self, columns, rows):
+        self.columns = list(columns)
+        self.rows = rows
+
+    @property
+    def shape(self):
+        return (len(self.rows), len(self.columns))
+
+def read_csv(path, usecols=None, raw=()):
+    '''
+    Read a CSV file as pandas.read_csv would type it.
+
+    Args:
+        path (str): CSV file
+        usecols (list): Columns to keep, in this order, or None for all of them
+        raw (tuple): Columns to keep as strings, as with dtype='str'
+
+    Returns:
+        Table: The typed rows
+    '''
+    rows = iter_csv(path)
+    header = next(rows)
+    columns = [column for column in usecols if column in header] if usecols else header
+    positions = [header.index(column) for column in columns]
+    types = ColumnTypes(columns, raw, len(header))
+    kept = []
+    for row in rows:
+        row = [row[i] for i in positions]
+        types.add(row)
+        kept.append(row)
+    kinds = types.kinds()
+    return Table(columns, [typed(kinds, row) for row in kept])
+
+def write_csv(path, columns, rows):
+    '''
+    Write a table as pandas' to_csv(index=False) writes it.
+    '''
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+def _json_number(value):
+    '''
+    Value as pandas.to_numeric converts it: an int, a float, or None if it is
+    not numeric.
+    '''
+    if isinstance(value, (int, float)):
+        return value
+    if INT_PATTERN.fullmatch(value):
+        return int(value)
+    if NUMBER_PATTERN.fullmatch(value) and value.strip() == value:
+        return float(value)
+    return None
+
+def json_rows(columns, rows, numeric_columns=()):
+    '''
+    Rows as a compact JSON array of arrays in column order, with missing values
+    as null. Columns in numeric_columns are written as integers when every
+    value is numeric.
+    '''
+    rows = [list(row) for row in rows]
+    for i, column in enumerate(columns):
+        if column not in numeric_columns:
+            continue
+        numbers = [None if row[i] is None else _json_number(row[i]) for row in rows]
+        if any(number is None and row[i] is not None for number, row in zip(numbers, rows)):
+            continue
+        for number, row in zip(numbers, rows):
+            if isinstance(number, float):
+                if not number.is_integer():
+                    raise UnsupportedCSV(f"Column {column} has a value that is not a whole number")
+                number = int(number)
+            row[i] = number
+    return json.dumps(rows, ensure_ascii=False, separators=(',', ':'))
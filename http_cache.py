@@ -0,0 +1,242 @@
+#!python3
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Default location of the on-disk response cache.
+DEFAULT_CACHE_DIR = '.http-cache'
+
+# Time to live in seconds for each kind of endpoint, as (URL regex, seconds).
+# The first match wins; URLs that match nothing use DEFAULT_TTL.
+DEFAULT_TTLS = [
+    (r'/Panopto/api/v1/sessions/[^/]+/viewers', 24 * 3600),
+    (r'/Panopto/api/v1/folders/', 3600),
+    (r'api\.github\.com/', 600),
+]
+DEFAULT_TTL = 3600
+
+# Request headers that make a request conditional on the caller's own copy
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+# Headers of a download that do not describe the decoded body stored in the cache
+TRANSFER_HEADERS = ('Content-Encoding', 'Content-Length', 'Content-Range', 'Transfer-Encoding')
+
+class OfflineCacheMiss(requests.exceptions.RequestException):
+    '''
+    Raised in offline mode for a request that is not in the cache.
+    It is a RequestException, so callers handle it like any failed request.
+    '''
+
+class ResponseCache():
+    '''
+    Opt-in on-disk cache of HTTP responses, for re-running the pipelines quickly
+    and reproducing them without network access.
+
+    Responses are keyed by method, URL and query parameters (not headers, so the
+    OAuth token does not matter). Only successful (200) responses are stored, each
+    as a JSON metadata file and a body file; put_file stores a download streamed
+    to disk. Entries expire after the TTL of their endpoint, and the least recently
+    used are evicted once the cache is larger than max_bytes. In offline mode no
+    request is sent: cached responses are replayed whatever their age and anything
+    else raises OfflineCacheMiss.
+
+    Conditional requests work with the cache: a 304 refreshes the stored entry
+    and replays it, and a conditional request for something not stored is sent
+    unconditionally, so its body is stored for offline runs.
+    '''
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttls=None, default_ttl=DEFAULT_TTL,
+                 max_bytes=256 * 2 ** 20, offline=False):
+        self.directory = directory
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in (ttls or DEFAULT_TTLS)]
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Index of key -> (size in bytes, last access time), for LRU eviction
+        self.index = {}
+        for file_name in os.listdir(directory):
+            if file_name.endswith('.json'):
+                key = file_name[:-len('.json')]
+                meta_path, body_path = self._paths(key)
+                try:
+                    size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+                    self.index[key] = (size, os.path.getmtime(meta_path))
+                except OSError:
+                    continue
+
+    @staticmethod
+    def key(method, url, params=None):
+        '''
+        Cache key of a request: a hash of the method, URL and sorted query parameters.
+        '''
+        items = sorted((str(name), str(value)) for name, value in (params or {}).items())
+        encoded = json.dumps([method.upper(), url, items]).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _paths(self, key):
+        return (os.path.join(self.directory, key + '.json'),
+                os.path.join(self.directory, key + '.body'))
+
+    def ttl(self, url):
+        '''
+        Time to live of responses from a URL.
+        '''
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def get(self, method, url, params=None, stale=False):
+        '''
+        Return the cached response for a request, or None if it is missing or expired.
+        Expired responses are still returned in offline mode, or with stale.
+        '''
+        key = self.key(method, url, params)
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+
+        if not (self.offline or stale) and time.time() - meta['stored_at'] > self.ttl(url):
+            return None
+
+        # Record the access for LRU eviction
+        with self.lock:
+            now = time.time()
+            os.utime(meta_path, (now, now))
+            if key in self.index:
+                self.index[key] = (self.index[key][0], now)
+
+        response = requests.Response()
+        response.status_code = meta['status_code']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.url = meta['url']
+        response.encoding = meta.get('encoding')
+        response._content = body
+        response.from_cache = True
+        return response
+
+    def has(self, method, url, params=None):
+        '''
+        Whether a response is stored for a request, whatever its age.
+        '''
+        return os.path.exists(self._paths(self.key(method, url, params))[0])
+
+    def put(self, method, url, params, response):
+        '''
+        Store a successful response, then evict old entries if the cache is too large.
+        '''
+        if response.status_code != 200:
+            return
+        self._store(method, url, params, response, dict(response.headers), response.content)
+
+    def put_file(self, url, path, response):
+        '''
+        Store a file downloaded from url, e.g. streamed to disk by a GET (200 or
+        206) or confirmed current by a 304, as the body of a 200 response for url.
+        '''
+        headers = {name: value for name, value in response.headers.items() if name not in TRANSFER_HEADERS}
+        self._store('GET', url, None, response, headers, path)
+
+    def _store(self, method, url, params, response, headers, body):
+        # body is the content, or the path of a file holding it
+        key = self.key(method, url, params)
+        meta_path, body_path = self._paths(key)
+        meta = {
+            'method': method.upper(),
+            'url': response.url or url,
+            'params': params,
+            'status_code': 200,
+            'headers': headers,
+            'encoding': response.encoding,
+            'stored_at': time.time(),
+        }
+        with self.lock:
+            # Write the body first so a metadata file always has its body
+            if isinstance(body, bytes):
+                with open(body_path + '.tmp', 'wb') as f:
+                    f.write(body)
+            else:
+                shutil.copyfile(body, body_path + '.tmp')
+            os.replace(body_path + '.tmp', body_path)
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(meta_path + '.tmp', meta_path)
+            self.index[key] = (os.path.getsize(body_path) + os.path.getsize(meta_path), time.time())
+            self._evict()
+
+    def refresh(self, method, url, params, response):
+        '''
+        Treat a 304 as a hit on the stored entry: restart its time to live and
+        take the new validators. Returns False if nothing is stored for it.
+        '''
+        key = self.key(method, url, params)
+        meta_path, _ = self._paths(key)
+        with self.lock:
+            try:
+                with open(meta_path, encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                return False
+            for name in ('ETag', 'Last-Modified'):
+                if response.headers.get(name):
+                    meta['headers'][name] = response.headers[name]
+            meta['stored_at'] = time.time()
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(meta_path + '.tmp', meta_path)
+            if key in self.index:
+                self.index[key] = (self.index[key][0], time.time())
+        return True
+
+    def _evict(self):
+        total = sum(size for size, _ in self.index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self.index.items(), key=lambda item: item[1][1]):
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            del self.index[key]
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def request(self, session, method, url, params=None, **kwargs):
+        '''
+        Send a request through the cache: replay a cached response if there is a
+        fresh one, otherwise send it with the given session (or the requests
+        module) and store the response. A 304 to a conditional request replays
+        the stored response, refreshed; with nothing stored, the request is sent
+        without its conditional headers so there is a body to store.
+        '''
+        cached = self.get(method, url, params)
+        if cached is not None:
+            return cached
+        if self.offline:
+            raise OfflineCacheMiss(f'Offline and not cached: {method.upper()} {url} {params or ""}')
+        stored = self.get(method, url, params, stale=True)
+        if stored is None and kwargs.get('headers'):
+            headers = CaseInsensitiveDict(kwargs['headers'])
+            for name in CONDITIONAL_HEADERS:
+                headers.pop(name, None)
+            kwargs['headers'] = headers
+        response = session.request(method, url, params=params, **kwargs)
+        if response.status_code == 304 and stored is not None:
+            self.refresh(method, url, params, response)
+            return stored
+        self.put(method, url, params, response)
+        return response
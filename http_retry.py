@@ -0,0 +1,162 @@
+#!python3
+import time
+import random
+import threading
+import requests
+import pipeline_metrics
+from email.utils import parsedate_to_datetime
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Only requests that are safe to repeat are retried
+RETRY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+class RequestBudgetExceeded(requests.exceptions.Timeout):
+    '''
+    Raised when a request and its retries run out of their time budget.
+    '''
+
+class TokenBucket():
+    '''
+    Token-bucket rate limiter shared by every thread sending requests.
+
+    Tokens are added at rate per second up to capacity, and each request takes
+    one, so bursts of up to capacity requests are allowed but the average stays
+    at the rate. With no rate the bucket never limits, but pause() still holds
+    every thread back, e.g. for a server's Retry-After.
+    '''
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        '''
+        Wait for a token. Returns False, without taking one, if none is
+        available before the deadline (a time.monotonic() value).
+        '''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.rate is None:
+                        return True
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        '''
+        Hold back every request for the given number of seconds.
+        '''
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class RetryingSession(requests.Session):
+    '''
+    requests.Session that rate limits and retries its requests.
+
+    Each request first takes a token from the rate limiter. Throttled (429) and
+    transient server error responses, connection errors and timeouts are retried
+    with exponential backoff and full jitter, or after the server's Retry-After
+    if it sends one. A Retry-After pauses the shared rate limiter, so every
+    worker backs off together rather than each finding out with a request of its
+    own. Errors are retried up to max_retries times; a 429 with a Retry-After is
+    the server setting the pace rather than failing, so it is retried for as long
+    as the time budget allows. Each request, with its retries and waits, has a
+    budget of budget seconds: every attempt's timeout is cut to what is left of
+    it, and RequestBudgetExceeded is raised once it runs out. A response still
+    failing after the last retry is returned for the caller to handle.
+    '''
+    def __init__(self, rate_limiter=None, max_retries=5, backoff=0.5, max_backoff=30.0, budget=120.0):
+        super().__init__()
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+
+    @staticmethod
+    def retry_after(response):
+        '''
+        Seconds to wait from a response's Retry-After header, or None. Accepts
+        seconds (fractions too) or an HTTP date.
+        '''
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def backoff_delay(self, attempt):
+        '''
+        Exponential backoff with full jitter for the given retry (0-based).
+        '''
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method, url, *args, **kwargs):
+        if method.upper() not in RETRY_METHODS:
+            return super().request(method, url, *args, **kwargs)
+
+        timeout = kwargs.pop('timeout', None)
+        deadline = time.monotonic() + self.budget
+        # Retries so far, and how many of them were for errors rather than paced throttling
+        attempt = failures = 0
+        while True:
+            if not self.rate_limiter.acquire(deadline):
+                raise RequestBudgetExceeded(f"Rate limited past the time budget: {method} {url}")
+            remaining = deadline - time.monotonic()
+            # A pause or sleep can overshoot the deadline, and urllib3 rejects a timeout <= 0
+            if remaining <= 0:
+                raise RequestBudgetExceeded(f"Out of time budget after {attempt} attempts: {method} {url}")
+            response = error = None
+            try:
+                response = super().request(method, url, *args, timeout=min(timeout or remaining, remaining),
+                                           **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+            retry_after = self.retry_after(response) if response is not None else None
+            paced = retry_after is not None and response.status_code == 429
+            if not paced and failures >= self.max_retries:
+                if error:
+                    raise error
+                return response
+
+            delay = retry_after if retry_after is not None else self.backoff_delay(failures)
+            if response is not None and (retry_after is not None or response.status_code == 429):
+                self.rate_limiter.pause(delay)
+            if time.monotonic() + delay >= deadline:
+                if error:
+                    raise RequestBudgetExceeded(f"Out of time budget after {attempt + 1} attempts: {error}")
+                return response
+
+            if not paced:
+                reason = f"HTTP {response.status_code}" if response is not None else type(error).__name__
+                print(f"Retrying {method} {url} in {delay:.2f}s ({reason}, retry {failures + 1} of {self.max_retries})")
+                failures += 1
+                pipeline_metrics.count('http_retries')
+            else:
+                pipeline_metrics.count('http_throttled')
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt += 1
@@ -1,17 +1,314 @@
-import pandas as pd
 import requests
 import re
 import os
+import sys
 import glob
+import argparse
+import json
+import time
+import hashlib
+import shutil
+import contextlib
+import importlib
+import importlib.util
 from datetime import datetime
+from functools import lru_cache
+from http_cache import ResponseCache, OfflineCacheMiss, DEFAULT_CACHE_DIR
+from link_checker import LinkChecker
+import pipeline_metrics
+import csv_tables
 
-def download_latest_report(force_download=False):
+class _LazyModule():
+    """Stand-in for a module that is only imported when one of its attributes is used."""
+    def __init__(self, name):
+        self._name = name
+    
+    def __getattr__(self, attribute):
+        return getattr(importlib.import_module(self._name), attribute)
+
+# pandas takes most of the start-up time, and the lite engine does not need it
+pd = _LazyModule('pandas')
+
+# Registry of learning object types: type name -> case-insensitive regex matched
+# anywhere in the URL. Order sets precedence when a URL matches more than one
+# type. Patterns must not contain capturing groups. Adding a new LO host only
+# needs a new entry here.
+LO_TYPES = {
+    'Panopto': r'panopto',
+    'ThingLink': r'thinglink',
+    'Articulate': r'articulate',
+    'Wordpress': r'wordpress',
+    'Powtoon': r'powtoon',
+}
+
+# Host of the Panopto catalog, and other hosts that serve the same sessions
+PANOPTO_HOST = 'southampton.cloud.panopto.eu'
+PANOPTO_HOST_ALIASES = {
+    'coursecast.soton.ac.uk': PANOPTO_HOST,
+}
+
+# Host and session GUID of Panopto links: the id query parameter of any page,
+# e.g. Pages/Viewer.aspx?id=<session id> or Pages/Embed.aspx?id=<session id>&autoplay=false
+PANOPTO_LINK_PATTERN = re.compile(
+    r'^(?:https?:)?//(?:www\.)?(?P<host>[^/?#:]+)(?::\d+)?/[^?#]*\?(?:[^#]*[&;])?id='
+    r'(?P<id>[0-9a-f]{8}-(?:[0-9a-f]{4}-){3}[0-9a-f]{12})(?![0-9a-f])',
+    re.IGNORECASE
+)
+
+# Engines that build the tables. 'lite' uses only the standard library and starts
+# fast; 'pandas' handles large reports, --chunksize and Parquet. 'auto' picks lite
+# for reports up to LITE_MAX_BYTES and falls back to pandas for data the lite
+# engine cannot write exactly as pandas does.
+ENGINES = ('auto', 'lite', 'pandas')
+LITE_MAX_BYTES = 20 * 2 ** 20
+
+# Columns of the check-links report kept by the streaming mode, with compact dtypes
+REPORT_DTYPES = {
+    'URL': 'str',
+    'Status Code': 'category',
+    'Content-Type': 'category',
+    'Parent URL': 'category',
+    'Input Line': 'Int64',
+}
+
+@lru_cache(maxsize=None)
+def _compile_lo_types(lo_types):
+    """
+    Compile the pattern of each type in a registry, in order of precedence.
+    """
+    return [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in lo_types]
+
+def classify_learning_objects(urls, lo_types=LO_TYPES):
+    """
+    Classify a column of URLs by learning object type, one vectorized match per
+    type over the distinct URLs, as reports link the same URL from many pages.
+    
+    Args:
+        urls (pd.Series): URLs to classify
+        lo_types (dict): Registry of type name -> regex, in order of precedence
+        
+    Returns:
+        pd.Series: Type name of each URL, or NaN if it is not a learning object
+    """
+    unique = pd.Series(urls.dropna().unique(), dtype=object)
+    types = pd.Series(float('nan'), index=unique, dtype=object)
+    # Lowest precedence first, so the first matching type in registry order wins
+    for name, pattern in reversed(_compile_lo_types(tuple(lo_types.items()))):
+        types[unique.str.contains(pattern, na=False).to_numpy()] = name
+    return urls.map(types)
+
+def classify_url(url, lo_types=LO_TYPES):
+    """
+    Classify one URL by learning object type, as classify_learning_objects does.
+    
+    Args:
+        url (str): URL to classify
+        lo_types (dict): Registry of type name -> regex, in order of precedence
+        
+    Returns:
+        str: Type name, or None if it is not a learning object
+    """
+    for name, pattern in _compile_lo_types(tuple(lo_types.items())):
+        if pattern.search(url):
+            return name
+    return None
+
+# Dated check-links reports, local or on GitHub
+REPORT_NAME_PATTERN = re.compile(r'check-links-report-(\d{4}-\d{2}-\d{2})\.csv$')
+
+# Per-report results of the history mode, keyed by report content and LO rules
+HISTORY_DIR = 'reports/.history'
+
+# Tables compared with the previous run, and where the previous run's copies are kept
+DELTA_TABLES = ('all_lo_table', 'panopto_table')
+PREVIOUS_TABLES_DIR = 'tables/previous'
+
+# Status dimension of the aggregate cube: classes of HTTP status codes, 'error'
+# for anything else (e.g. a timeout) and 'unknown' for a missing code. Links in
+# BROKEN_STATUS_CLASSES count as broken.
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx', 'error', 'unknown')
+BROKEN_STATUS_CLASSES = ('4xx', '5xx', 'error')
+STATUS_CODE_PATTERN = re.compile(r'([1-5])\d\d(?:\.0)?')
+
+# Parquet types of table columns by name, so a table has the same schema whichever
+# engine writes it and with or without --chunksize. Other columns are stored as
+# text, status codes included, since re-checks and the streaming mode give text.
+PARQUET_INT_COLUMNS = ('Input Line', 'n', 'links', 'broken', *LO_TYPES, *STATUS_CLASSES)
+PARQUET_FLOAT_COLUMNS = ('broken ratio',)
+
+# Columns written as numbers, rather than strings, in the JSON payloads
+JSON_NUMERIC_COLUMNS = ('Status Code', 'Previous Status Code', 'Input Line', 'n')
+
+# GitHub location of the link crawler reports
+GITHUB_API_URL = "https://api.github.com/repos/unisotonlibrary/link-crawler/contents/reports"
+RAW_URL_TEMPLATE = "https://raw.githubusercontent.com/unisotonlibrary/link-crawler/main/reports/{filename}"
+
+# ETag / Last-Modified validators from previous downloads, keyed by URL
+VALIDATORS_FILE = 'reports/.download-validators.json'
+
+def _load_validators():
+    """Load the persisted HTTP validators, or an empty dict if there are none."""
+    try:
+        with open(VALIDATORS_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_validators(validators):
+    """Persist the HTTP validators, replacing the file atomically."""
+    tmp_path = VALIDATORS_FILE + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(validators, f, indent=2)
+    os.replace(tmp_path, VALIDATORS_FILE)
+
+def _conditional_headers(entry):
+    """Build If-None-Match / If-Modified-Since headers from a validators entry."""
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def _response_validators(response):
+    """Extract the validators of a response."""
+    return {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+
+def list_remote_reports(validators, cache=None):
+    """
+    List the files in the GitHub reports directory with a conditional request.
+    
+    Args:
+        validators (dict): Persisted validators, updated in place
+        cache (ResponseCache): Optional response cache to replay the listing from
+        
+    Returns:
+        list: File entries of the directory, each with at least a 'name'
+    """
+    entry = validators.get(GITHUB_API_URL, {})
+    headers = {'Accept': 'application/vnd.github.v3+json'}
+    if entry.get('files') is not None:
+        headers.update(_conditional_headers(entry))
+    
+    start = time.perf_counter()
+    if cache:
+        response = cache.request(requests, 'GET', GITHUB_API_URL, headers=headers)
+    else:
+        response = requests.get(GITHUB_API_URL, headers=headers)
+    pipeline_metrics.record_response('github_listing', response, time.perf_counter() - start)
+    if response.status_code == 304:
+        print("Report listing not modified since the last run")
+        return entry['files']
+    response.raise_for_status()
+    
+    files = [{'name': file['name']} for file in response.json()]
+    validators[GITHUB_API_URL] = dict(_response_validators(response), files=files)
+    return files
+
+def download_file(url, output_path, validators, chunk_size=1 << 16, cache=None, force=False):
+    """
+    Download a file by streaming it to a temporary file that is renamed into
+    place once complete, so an interrupted download never looks like a report.
+    
+    If the file exists and is unchanged on the server (304), nothing is
+    downloaded, unless force is set. A partial download left by an interrupted run is resumed with a
+    range request, as long as the server copy still has the same ETag.
+    
+    Args:
+        url (str): URL of the file
+        output_path (str): Where to save the file
+        validators (dict): Persisted validators, updated in place
+        chunk_size (int): Bytes to write at a time
+        cache (ResponseCache): Optional response cache; downloaded reports are
+            stored in it too, so an offline run can restore them
+        force (bool): Download the file even if the local copy is current
+        
+    Returns:
+        bool: True if the file was downloaded, False if the local copy is current
+    """
+    if cache and cache.offline:
+        if os.path.exists(output_path):
+            return False
+        cached = cache.get('GET', url)
+        if cached is None:
+            raise OfflineCacheMiss(f"Offline and not downloaded: {url}")
+        print(f"Restoring {output_path} from the response cache")
+        with open(output_path + '.part', 'wb') as f:
+            f.write(cached.content)
+        os.replace(output_path + '.part', output_path)
+        return True
+    
+    part_path = output_path + '.part'
+    entry = validators.get(url, {})
+    headers = {'Accept-Encoding': 'gzip, deflate'}
+    resume_from = 0
+    
+    if entry.get('complete') and os.path.exists(output_path):
+        if not force:
+            headers.update(_conditional_headers(entry))
+    elif os.path.exists(part_path) and entry.get('etag'):
+        # Resume an interrupted download. Ranges refer to the unencoded bytes.
+        resume_from = os.path.getsize(part_path)
+        headers.update({
+            'Accept-Encoding': 'identity',
+            'Range': f'bytes={resume_from}-',
+            'If-Range': entry['etag'],
+        })
+    
+    start = time.perf_counter()
+    with requests.get(url, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            print(f"{output_path} not modified since the last download")
+            pipeline_metrics.record_response('report_download', response, time.perf_counter() - start, 0)
+            if cache and not cache.refresh('GET', url, None, response):
+                cache.put_file(url, output_path, response)
+            return False
+        if response.status_code == 416:
+            # The partial file is unusable for a range request; start again
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(part_path)
+            validators.pop(url, None)
+            return download_file(url, output_path, validators, chunk_size, cache, force)
+        response.raise_for_status()
+        
+        if response.status_code == 206:
+            print(f"Resuming download at byte {resume_from}")
+            mode = 'ab'
+        else:
+            mode = 'wb'
+            # A new download: remember its validators so it can be resumed
+            validators[url] = dict(_response_validators(response), complete=False)
+            _save_validators(validators)
+        
+        written = 0
+        with open(part_path, mode) as f:
+            # iter_content decompresses gzip/deflate transfers as they stream
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+        pipeline_metrics.record_response('report_download', response, time.perf_counter() - start, written)
+    
+    os.replace(part_path, output_path)
+    validators[url]['complete'] = True
+    _save_validators(validators)
+    if cache:
+        cache.put_file(url, output_path, response)
+    return True
+
+def download_latest_report(force_download=False, cache=None):
     """
     Downloads the most recent check-links-report file from the GitHub repository
     only if it's newer than the local version.
     
+    The listing and the file are fetched with conditional requests, using the
+    validators saved in VALIDATORS_FILE, so an unchanged repository costs a 304.
+    
     Args:
         force_download (bool): If True, downloads regardless of local version
+        cache (ResponseCache): Optional response cache for the GitHub requests
         
     Returns:
         str: Path to the latest report file (downloaded or existing)
@@ -39,13 +336,9 @@ def download_latest_report(force_download=False):
                     continue
 
         # Get GitHub repository contents
-        api_url = "https://api.github.com/repos/unisotonlibrary/link-crawler/contents/reports"
-        raw_url_template = "https://raw.githubusercontent.com/unisotonlibrary/link-crawler/main/reports/{filename}"
-        
-        headers = {'Accept': 'application/vnd.github.v3+json'}
-        response = requests.get(api_url, headers=headers)
-        response.raise_for_status()
-        files = response.json()
+        validators = _load_validators()
+        files = list_remote_reports(validators, cache)
+        _save_validators(validators)
 
         # Find the most recent report file on GitHub
         remote_latest = None
@@ -69,20 +362,19 @@ def download_latest_report(force_download=False):
             print("No check-links-report files found in the repository")
             return None, False
 
-        # Compare dates and decide whether to download
+        download_url = RAW_URL_TEMPLATE.format(filename=remote_latest)
+        output_path = os.path.join('reports', remote_latest)
+
+        # Compare dates and decide whether to download. A current report missing
+        # from the cache still gets a conditional request, so the cache holds it.
         if not force_download and local_latest_date and remote_latest_date <= local_latest_date:
-            print(f"Latest report already downloaded: {local_latest}")
-            return local_latest, False
+            if not (cache and local_latest == output_path and not cache.has('GET', download_url)):
+                print(f"Latest report already downloaded: {local_latest}")
+                return local_latest, False
 
         # Download the latest file
-        download_url = raw_url_template.format(filename=remote_latest)
-        response = requests.get(download_url)
-        response.raise_for_status()
-
-        # Save the file
-        output_path = os.path.join('reports', remote_latest)
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
+        if not download_file(download_url, output_path, validators, cache=cache, force=force_download):
+            return output_path, False
 
         print(f"Successfully downloaded new report: {remote_latest}")
         print(f"File saved to: {output_path}")
@@ -101,13 +393,265 @@ def download_latest_report(force_download=False):
             return local_latest, False
         return None, False
 
-def process_learning_objects(libguides_file, panopto_file):
+def _json_rows(df):
+    """
+    Convert a table to JSON rows (arrays in column order). Categoricals become
+    plain values, missing values become null, and the JSON_NUMERIC_COLUMNS are
+    written as integers when every value is numeric.
+    """
+    df = df.astype(object)
+    for column in df.columns:
+        if column in JSON_NUMERIC_COLUMNS:
+            numeric = pd.to_numeric(df[column], errors='coerce')
+            if numeric.notna().sum() == df[column].notna().sum():
+                df[column] = numeric.astype('Int64').astype(object)
+    rows = df.where(df.notna(), None).values.tolist()
+    return json.dumps(rows, ensure_ascii=False, separators=(',', ':'))
+
+def _clear_json_pages(name):
+    """Remove the JSON pages of a table left by a previous run."""
+    for page in glob.glob(f'tables/pages/{name}-*.json'):
+        os.remove(page)
+
+def _write_json_page(data, name, page_number):
+    """Write one page of JSON rows of a table, returning its path relative to tables/."""
+    os.makedirs('tables/pages', exist_ok=True)
+    page = f'pages/{name}-{page_number}.json'
+    with open(os.path.join('tables', page), 'w', encoding='utf-8') as f:
+        f.write(data)
+    return page
+
+def _write_json_manifest(name, columns, rows, pages=None, data=None):
+    """
+    Write tables/<name>.json. It holds the column names and row count, and
+    either the rows themselves (data) or the list of page files (pages).
+    """
+    with open(f'tables/{name}.json', 'w', encoding='utf-8') as f:
+        f.write('{"columns":' + json.dumps(list(columns), separators=(',', ':')) + ',"rows":' + str(rows))
+        if pages is not None:
+            f.write(',"pages":' + json.dumps(pages, separators=(',', ':')))
+        else:
+            f.write(',"data":' + data)
+        f.write('}')
+
+def write_json_table(df, name, page_size=None):
+    """
+    Write a table as a compact, pre-typed JSON payload for the dashboard.
+    
+    Rows are written as arrays in column order, so column names are not repeated.
+    Without paging the rows are in tables/<name>.json itself; with paging they
+    are in tables/pages/<name>-<n>.json, listed in tables/<name>.json.
+    
+    Args:
+        df (pd.DataFrame): Table to write
+        name (str): Table name, used for tables/<name>.json
+        page_size (int): If set, split the rows into pages of this size
+    """
+    _clear_json_pages(name)
+    if page_size:
+        pages = [
+            _write_json_page(_json_rows(df.iloc[start:start + page_size]), name, number)
+            for number, start in enumerate(range(0, len(df), page_size), start=1)
+        ]
+        _write_json_manifest(name, df.columns, len(df), pages=pages)
+    else:
+        _write_json_manifest(name, df.columns, len(df), data=_json_rows(df))
+
+def _status_code_text(value):
+    """Text of a status code, without the '.0' of one read as a float."""
+    if pd.isna(value):
+        return None
+    text = str(value)
+    return text[:-2] if text.endswith('.0') and STATUS_CODE_PATTERN.fullmatch(text) else text
+
+def _parquet_table(df):
+    """
+    Convert a table to an Arrow table typed by column name (PARQUET_INT_COLUMNS,
+    PARQUET_FLOAT_COLUMNS, text otherwise) rather than by its values, so a chunk
+    with an all-null column, or a table from the other engine, has the same schema.
+    """
+    import pyarrow as pa
+    fields, columns = [], {}
+    for name in df.columns:
+        column = df[name]
+        if name in PARQUET_INT_COLUMNS:
+            fields.append((name, pa.int64()))
+            columns[name] = column.astype('Int64')
+        elif name in PARQUET_FLOAT_COLUMNS:
+            fields.append((name, pa.float64()))
+            columns[name] = column.astype('float64')
+        else:
+            fields.append((name, pa.string()))
+            if name in JSON_NUMERIC_COLUMNS:
+                column = column.astype(object).map(_status_code_text)
+            columns[name] = column.astype('string')
+    return pa.Table.from_pandas(pd.DataFrame(columns, index=df.index), schema=pa.schema(fields),
+                                preserve_index=False)
+
+def write_parquet_table(df, name):
+    """
+    Write a table to tables/<name>.parquet for downstream analysis.
+    Skipped with a message if pyarrow is not installed.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print(f"Parquet engine not installed, skipping tables/{name}.parquet")
+        return
+    pq.write_table(_parquet_table(df), f'tables/{name}.parquet')
+
+def _append_parquet(writers, df, name):
+    """
+    Append a chunk to tables/<name>.parquet, opening a writer on the first call.
+    Returns False if pyarrow is not installed.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return False
+    table = _parquet_table(df)
+    if name not in writers:
+        writers[name] = pq.ParquetWriter(f'tables/{name}.parquet', table.schema)
+    writers[name].write_table(table)
+    return True
+
+def write_csv_table(table, name, page_size=None, parquet=False):
+    """
+    Write a csv_tables.Table to tables/<name>.csv and its JSON payload, byte
+    for byte as the pandas engine writes a DataFrame.
+    
+    Args:
+        table (csv_tables.Table): Table to write
+        name (str): Table name
+        page_size (int): If set, split the JSON rows into pages of this size
+        parquet (bool): Also write tables/<name>.parquet (needs pandas)
+    """
+    csv_tables.write_csv(f'tables/{name}.csv', table.columns, table.rows)
+    _clear_json_pages(name)
+    if page_size:
+        pages = [
+            _write_json_page(csv_tables.json_rows(table.columns, table.rows[start:start + page_size],
+                                                  JSON_NUMERIC_COLUMNS), name, number)
+            for number, start in enumerate(range(0, len(table.rows), page_size), start=1)
+        ]
+        _write_json_manifest(name, table.columns, len(table.rows), pages=pages)
+    else:
+        _write_json_manifest(name, table.columns, len(table.rows),
+                             data=csv_tables.json_rows(table.columns, table.rows, JSON_NUMERIC_COLUMNS))
+    if parquet:
+        write_parquet_table(pd.DataFrame(table.rows, columns=table.columns), name)
+
+def status_class(status):
+    """Class of a status code in the aggregate cube, one of STATUS_CLASSES."""
+    if status is None or status != status:
+        return 'unknown'
+    match = STATUS_CODE_PATTERN.fullmatch(str(status))
+    return match.group(1) + 'xx' if match else 'error'
+
+def count_cube_cells(dfm, cells):
+    """
+    Add the learning objects of a DataFrame to the cells of the aggregate cube.
+    
+    Args:
+        dfm (pd.DataFrame): Classified learning objects
+        cells (dict): (Parent URL, lo, status class) -> links, updated in place
+    """
+    status = dfm['Status Code'].astype(object)
+    keys = pd.DataFrame({
+        'Parent URL': dfm['Parent URL'].astype(object),
+        'lo': dfm['lo'].astype(object),
+        'status class': status.where(status.notna(), None).map(status_class),
+    })
+    for (parent, lo, status_cls), n in keys.groupby(list(keys.columns), dropna=False, sort=False).size().items():
+        key = (None if pd.isna(parent) else parent, lo, status_cls)
+        cells[key] = cells.get(key, 0) + int(n)
+
+def build_cube_tables(cells):
+    """
+    Roll the cells of the aggregate cube up into small tables, so dashboards and
+    reports need not rescan every learning object:
+    
+    - lo_cube_table: links by Parent URL, lo and status class
+    - lo_page_table: links per Parent URL by LO type, and the broken links
+    - lo_type_table: links per LO type by status class, and the broken links
+    
+    Broken ratios are rounded to 4 decimal places.
+    
+    Args:
+        cells (dict): (Parent URL, lo, status class) -> links
+        
+    Returns:
+        dict: Table name -> csv_tables.Table
+    """
+    pages = {}
+    types = {}
+    broken = {}
+    for (parent, lo, status_cls), n in cells.items():
+        pages.setdefault(parent, dict.fromkeys(LO_TYPES, 0))[lo] += n
+        types.setdefault(lo, dict.fromkeys(STATUS_CLASSES, 0))[status_cls] += n
+        broken[parent] = broken.get(parent, 0) + (n if status_cls in BROKEN_STATUS_CLASSES else 0)
+    
+    def ratio(n_broken, links):
+        return round(n_broken / links, 4)
+    
+    # A missing Parent URL sorts first
+    page_rows = []
+    for parent, counts in sorted(pages.items(), key=lambda item: item[0] or ''):
+        links = sum(counts.values())
+        page_rows.append([parent, links, *counts.values(), broken[parent], ratio(broken[parent], links)])
+    type_rows = []
+    for lo, counts in sorted(types.items()):
+        links = sum(counts.values())
+        n_broken = sum(counts[status_cls] for status_cls in BROKEN_STATUS_CLASSES)
+        type_rows.append([lo, links, *counts.values(), n_broken, ratio(n_broken, links)])
+    cube_rows = [[*key, n] for key, n in sorted(cells.items(), key=lambda item: (item[0][0] or '', *item[0][1:]))]
+    
+    return {
+        'lo_cube_table': csv_tables.Table(['Parent URL', 'lo', 'status class', 'links'], cube_rows),
+        'lo_page_table': csv_tables.Table(['Parent URL', 'links', *LO_TYPES, 'broken', 'broken ratio'], page_rows),
+        'lo_type_table': csv_tables.Table(['lo', 'links', *STATUS_CLASSES, 'broken', 'broken ratio'], type_rows),
+    }
+
+def write_cube_tables(cells, parquet=False):
+    """Write the tables of build_cube_tables to tables/, as CSV and JSON (and Parquet)."""
+    for name, table in build_cube_tables(cells).items():
+        write_csv_table(table, name, parquet=parquet)
+
+def recheck_status_codes(urls, link_checker, as_text=False):
+    """
+    Fresh status codes of learning object URLs, to replace the report's.
+    
+    The codes are ints, unless a link could not be requested (e.g. 'Timeout')
+    or as_text is set, in which case they are all strings, so that a Status
+    Code column never mixes the two.
+    
+    Args:
+        urls (iterable): URLs to check, duplicates included
+        link_checker (LinkChecker): Checker holding the results so far
+        as_text (bool): Return every code as a string
+        
+    Returns:
+        dict: URL -> status code
+    """
+    statuses = link_checker.check(urls)
+    if as_text or not all(isinstance(status, int) for status in statuses.values()):
+        statuses = {url: str(status) for url, status in statuses.items()}
+    broken = sum(status_class(status) in BROKEN_STATUS_CLASSES for status in statuses.values())
+    print(f"Re-checked {len(statuses)} learning object URLs: {broken} broken")
+    return statuses
+
+def process_learning_objects(libguides_file, panopto_file, json_page_size=None, link_checker=None,
+                             parquet=False):
     """
     Process learning object data from LibGuides and Panopto files.
     
     Args:
         libguides_file (str): Path to the LibGuides CSV file
         panopto_file (str): Path to the Panopto recordings CSV file
+        json_page_size (int): If set, split the JSON tables into pages of this size
+        link_checker (LinkChecker): If set, re-check the learning object links
+            and use their fresh status codes
+        parquet (bool): Also write Parquet copies of the tables
         
     Returns:
         tuple: (summary_df, other_lo_df, panopto_joined_df)
@@ -116,68 +660,832 @@ def process_learning_objects(libguides_file, panopto_file):
     os.makedirs('tables', exist_ok=True)
     
     # Read input files
-    df = pd.read_csv(libguides_file)
-    panopto_df = pd.read_csv(panopto_file)
+    with pipeline_metrics.stage('read_csv'):
+        df = pd.read_csv(libguides_file)
+        panopto_df = pd.read_csv(panopto_file)
+    pipeline_metrics.count('report_rows', len(df))
     
-    # Get unique Panopto sessions
-    panopto_sessions = panopto_df[['Name', 'ID', 'Folder']].drop_duplicates(subset='ID', keep='first')
-    
-    # Filter LibGuides data for types of Learning Objects
-    dfm = df[
-        df['URL'].str.contains('[Aa]rticulate|[Tt]hinglink|[Ww]ordpress|[Pp]anopto|[Pp]owtoon', case=False)
-    ]
-    
-    # Create learning object type column
-    dfm['lo'] = dfm['URL'].apply(lambda x: 
-        'Panopto' if re.search('[Pp]anopto', x) else
-        'ThingLink' if re.search('[Tt]hinglink', x) else
-        'Articulate' if re.search('[Ar]ticulate', x) else
-        'Wordpress' if re.search('[Ww]ordpress', x) else
-        'Powtoon' if re.search('[Pp]owtoon', x) else
-        'Other'
-    )
+    # Index the Panopto sessions by their normalized link key
+    panopto_index = build_panopto_index(panopto_df)
+    
+    # Classify every URL once and keep the Learning Objects
+    with pipeline_metrics.stage('classify'):
+        lo = classify_learning_objects(df['URL'])
+        dfm = df[lo.notna()].assign(lo=lo.dropna())
+    pipeline_metrics.count('learning_objects', len(dfm))
+    
+    # Replace the report's status codes with fresh ones
+    if link_checker:
+        with pipeline_metrics.stage('recheck'):
+            statuses = recheck_status_codes(dfm['URL'].unique(), link_checker)
+            dfm = dfm.assign(**{'Status Code': dfm['URL'].map(statuses)})
     
-    # Count unique learning objects
-    summary_df = dfm.drop_duplicates(subset='URL', keep='first').groupby('lo').size().reset_index(name='n')
+    # Count unique learning objects, and links by page, type and status for the cube
+    with pipeline_metrics.stage('summary'):
+        summary_df = dfm.drop_duplicates(subset='URL', keep='first').groupby('lo').size().reset_index(name='n')
+        cube_cells = {}
+        count_cube_cells(dfm, cube_cells)
     
     # Rename dfm
     all_lo_df = dfm
     
-    # Process Panopto data
-    panopto_data = dfm[dfm['lo'] == 'Panopto'].copy()
-    panopto_data['ID'] = panopto_data['URL'].apply(lambda x: re.search(r'(?<=id=)[^&=]+', x).group())
+    # Process and join Panopto data
+    with pipeline_metrics.stage('panopto_merge'):
+        panopto_joined_df = join_panopto_sessions(dfm, panopto_index)
+    pipeline_metrics.count('panopto_matches', len(panopto_joined_df))
     
-    # Join Panopto data
-    panopto_joined_df = panopto_data.merge(panopto_sessions, how='inner', on='ID')
-    
-    # Save processed data
-    summary_df.to_csv('tables/lo_summary_table.csv', index=False)
-    all_lo_df.to_csv('tables/all_lo_table.csv', index=False)
-    panopto_joined_df.to_csv('tables/panopto_table.csv', index=False)
+    with pipeline_metrics.stage('write_tables'):
+        # Save processed data
+        summary_df.to_csv('tables/lo_summary_table.csv', index=False)
+        all_lo_df.to_csv('tables/all_lo_table.csv', index=False)
+        panopto_joined_df.to_csv('tables/panopto_table.csv', index=False)
+        
+        # JSON payloads for the dashboard, and columnar copies for analysis if asked for
+        for name, table in (('lo_summary_table', summary_df),
+                            ('all_lo_table', all_lo_df),
+                            ('panopto_table', panopto_joined_df)):
+            if parquet:
+                write_parquet_table(table, name)
+            write_json_table(table, name, page_size=None if name == 'lo_summary_table' else json_page_size)
+        write_cube_tables(cube_cells, parquet=parquet)
     
     return summary_df, all_lo_df, panopto_joined_df
 
+def panopto_link_keys(urls):
+    """
+    Normalized join keys of Panopto URLs: '<host>/<session GUID>', with the
+    host lowercased and mapped through PANOPTO_HOST_ALIASES and the GUID
+    lowercased. Viewer, embed and other pages of the same session share a key.
+    
+    Args:
+        urls (pd.Series): URLs to key
+        
+    Returns:
+        pd.Series: Key of each URL, or NaN if it has no session GUID
+    """
+    parts = urls.str.extract(PANOPTO_LINK_PATTERN)
+    hosts = parts['host'].str.lower().replace(PANOPTO_HOST_ALIASES)
+    return hosts + '/' + parts['id'].str.lower()
+
+def panopto_link_key(url):
+    """Normalized join key of one Panopto URL, as panopto_link_keys, or None."""
+    match = PANOPTO_LINK_PATTERN.search(url)
+    if not match:
+        return None
+    host = match.group('host').lower()
+    return PANOPTO_HOST_ALIASES.get(host, host) + '/' + match.group('id').lower()
+
+def build_panopto_index(panopto_df):
+    """
+    Index the Panopto recordings by normalized link key, keeping the first
+    recording of each key. Recordings are keyed by their URL, or by their ID
+    on PANOPTO_HOST if the URL is missing or has no session GUID.
+    
+    Args:
+        panopto_df (pd.DataFrame): Panopto recordings (Name, ID, Folder and optionally URL)
+        
+    Returns:
+        pd.DataFrame: Unique Panopto sessions (ID, Name, Folder) indexed by key
+    """
+    fallback = PANOPTO_HOST + '/' + panopto_df['ID'].astype(str).str.lower()
+    if 'URL' in panopto_df:
+        keys = panopto_link_keys(panopto_df['URL'].astype(str)).fillna(fallback)
+    else:
+        keys = fallback
+    sessions = panopto_df[['ID', 'Name', 'Folder']].set_index(pd.Index(keys, name='key'))
+    return sessions[~sessions.index.duplicated(keep='first')]
+
+def join_panopto_sessions(lo_df, panopto_index):
+    """
+    Join the Panopto learning objects to the recordings in the Panopto folder,
+    with a single hash join of their normalized link keys.
+    
+    Args:
+        lo_df (pd.DataFrame): Classified learning objects
+        panopto_index (pd.DataFrame): Unique Panopto sessions from build_panopto_index
+        
+    Returns:
+        pd.DataFrame: Panopto learning objects with the matching session details
+    """
+    panopto_data = lo_df[lo_df['lo'] == 'Panopto']
+    keyed = panopto_data.assign(key=panopto_link_keys(panopto_data['URL'].astype(str)))
+    joined = keyed.join(panopto_index, on='key', how='inner')
+    return joined.drop(columns='key').reset_index(drop=True)
+
+def stream_learning_objects(libguides_file, panopto_file, chunksize=100_000, link_checker=None,
+                            parquet=False):
+    """
+    Process learning object data in chunks, so peak memory does not depend on
+    the size of the LibGuides report.
+    
+    Only the report columns in REPORT_DTYPES are read, with categorical dtypes
+    for the repetitive ones. Each chunk is classified and joined to the Panopto
+    sessions, then appended to the output tables before the next is read.
+    The JSON tables are written with one page per chunk.
+    
+    Args:
+        libguides_file (str): Path to the LibGuides CSV file
+        panopto_file (str): Path to the Panopto recordings CSV file
+        chunksize (int): Number of report rows to read at a time
+        link_checker (LinkChecker): If set, re-check the learning object links
+            and use their fresh status codes; a URL is only checked once
+        parquet (bool): Also write Parquet copies of the tables
+        
+    Returns:
+        tuple: (summary_df, all_lo_rows, panopto_rows)
+    """
+    # Create tables directory if it doesn't exist
+    os.makedirs('tables', exist_ok=True)
+    
+    panopto_df = pd.read_csv(panopto_file)
+    panopto_index = build_panopto_index(panopto_df)
+    
+    reader = pd.read_csv(
+        libguides_file,
+        usecols=lambda column: column in REPORT_DTYPES,
+        dtype=REPORT_DTYPES,
+        chunksize=chunksize
+    )
+    
+    # Unique URLs per LO type, for the summary table, and the cells of the cube
+    unique_urls = {}
+    cube_cells = {}
+    all_lo_rows = 0
+    panopto_rows = 0
+    # JSON pages and columns of each table, and open Parquet writers
+    pages = {'all_lo_table': [], 'panopto_table': []}
+    columns = {}
+    parquet_writers = {}
+    has_parquet = parquet
+    for name in pages:
+        _clear_json_pages(name)
+    
+    for i, chunk in enumerate(pipeline_metrics.timed_iter('read_csv', reader)):
+        with pipeline_metrics.stage('classify'):
+            lo = classify_learning_objects(chunk['URL'])
+            dfm = chunk[lo.notna()].assign(lo=lo.dropna())
+        if link_checker:
+            with pipeline_metrics.stage('recheck'):
+                # Codes are read as text in this mode
+                statuses = recheck_status_codes(dfm['URL'].unique(), link_checker, as_text=True)
+                dfm = dfm.assign(**{'Status Code': dfm['URL'].map(statuses)})
+        with pipeline_metrics.stage('panopto_merge'):
+            panopto_joined_df = join_panopto_sessions(dfm, panopto_index)
+        
+        with pipeline_metrics.stage('summary'):
+            for lo_type, urls in dfm.groupby('lo', observed=True)['URL']:
+                unique_urls.setdefault(lo_type, set()).update(urls)
+            count_cube_cells(dfm, cube_cells)
+        
+        with pipeline_metrics.stage('write_tables'):
+            # The first chunk creates the tables with a header, the rest append
+            mode, header = ('w', True) if i == 0 else ('a', False)
+            dfm.to_csv('tables/all_lo_table.csv', mode=mode, header=header, index=False)
+            panopto_joined_df.to_csv('tables/panopto_table.csv', mode=mode, header=header, index=False)
+            
+            for name, table in (('all_lo_table', dfm), ('panopto_table', panopto_joined_df)):
+                columns[name] = table.columns
+                if len(table):
+                    pages[name].append(_write_json_page(_json_rows(table), name, len(pages[name]) + 1))
+                    has_parquet = has_parquet and _append_parquet(parquet_writers, table, name)
+        all_lo_rows += len(dfm)
+        panopto_rows += len(panopto_joined_df)
+        pipeline_metrics.count('report_rows', len(chunk))
+        pipeline_metrics.count('learning_objects', len(dfm))
+        pipeline_metrics.count('panopto_matches', len(panopto_joined_df))
+        print(f"Processed chunk {i + 1}: {len(chunk)} rows, {len(dfm)} learning objects")
+    
+    summary_df = pd.DataFrame(
+        [(lo_type, len(urls)) for lo_type, urls in sorted(unique_urls.items())],
+        columns=['lo', 'n']
+    )
+    
+    with pipeline_metrics.stage('write_tables'):
+        summary_df.to_csv('tables/lo_summary_table.csv', index=False)
+        
+        for name in pages:
+            if name in parquet_writers:
+                parquet_writers[name].close()
+            elif has_parquet:
+                # No rows in any chunk: still replace the previous run's table
+                write_parquet_table(pd.DataFrame(columns=columns.get(name, [])), name)
+        if parquet and not has_parquet:
+            print("Parquet engine not installed, skipping Parquet tables")
+        if has_parquet:
+            write_parquet_table(summary_df, 'lo_summary_table')
+        write_json_table(summary_df, 'lo_summary_table')
+        _write_json_manifest('all_lo_table', columns.get('all_lo_table', []), all_lo_rows,
+                             pages=pages['all_lo_table'])
+        _write_json_manifest('panopto_table', columns.get('panopto_table', []), panopto_rows,
+                             pages=pages['panopto_table'])
+        write_cube_tables(cube_cells, parquet=has_parquet)
+    
+    return summary_df, all_lo_rows, panopto_rows
+
+def _as_str(value):
+    """A value of a csv_tables.Table as pandas' astype(str) converts it."""
+    return 'nan' if value is None else str(value)
+
+def lite_process_learning_objects(libguides_file, panopto_file, json_page_size=None, link_checker=None,
+                                  parquet=False):
+    """
+    Process learning object data with the standard library only, writing the
+    same tables as process_learning_objects without importing pandas.
+    
+    The report is streamed with the csv module and classified one URL at a
+    time, keeping only the learning objects. Values are typed as pandas would
+    type them, so the CSV and JSON tables are byte-identical. Only Parquet
+    copies, if asked for, need pandas.
+    
+    Args:
+        libguides_file (str): Path to the LibGuides CSV file
+        panopto_file (str): Path to the Panopto recordings CSV file
+        json_page_size (int): If set, split the JSON tables into pages of this size
+        link_checker (LinkChecker): If set, re-check the learning object links
+            and use their fresh status codes
+        parquet (bool): Also write Parquet copies of the tables
+        
+    Returns:
+        tuple: (summary, all_lo, panopto_joined) as csv_tables.Table
+        
+    Raises:
+        csv_tables.UnsupportedCSV: If the data would not come out exactly as
+            with pandas, e.g. a report with float columns
+    """
+    os.makedirs('tables', exist_ok=True)
+    
+    with pipeline_metrics.stage('read_csv'):
+        catalog = csv_tables.read_csv(panopto_file)
+    panopto_index = {}
+    for row in catalog.rows:
+        recording = dict(zip(catalog.columns, row))
+        # Keyed as in build_panopto_index, from the URL and ID as strings
+        url, session_id = (_as_str(recording.get('URL')), _as_str(recording['ID']))
+        key = panopto_link_key(url) or PANOPTO_HOST + '/' + session_id.lower()
+        panopto_index.setdefault(key, [recording['ID'], recording['Name'], recording['Folder']])
+    
+    rows = csv_tables.iter_csv(libguides_file)
+    columns = next(rows)
+    if {'lo', 'key', 'ID', 'Name', 'Folder'} & set(columns):
+        raise csv_tables.UnsupportedCSV("The report has columns that the tables add")
+    url_at, parent_at, status_at = columns.index('URL'), columns.index('Parent URL'), columns.index('Status Code')
+    types = csv_tables.ColumnTypes(columns)
+    lo_rows = []
+    report_rows = 0
+    with pipeline_metrics.stage('classify'):
+        for row in rows:
+            types.add(row)
+            report_rows += 1
+            lo = classify_url(row[url_at]) if row[url_at] is not None else None
+            if lo:
+                lo_rows.append(row + [lo])
+        kinds = types.kinds()
+        if kinds[url_at] not in ('str', 'empty'):
+            raise csv_tables.UnsupportedCSV("The URL column is not text")
+        all_lo = csv_tables.Table(columns + ['lo'], [csv_tables.typed(kinds + ['str'], row) for row in lo_rows])
+    pipeline_metrics.count('report_rows', report_rows)
+    pipeline_metrics.count('learning_objects', len(all_lo.rows))
+    
+    # Replace the report's status codes with fresh ones
+    if link_checker:
+        with pipeline_metrics.stage('recheck'):
+            statuses = recheck_status_codes([row[url_at] for row in all_lo.rows], link_checker)
+            for row in all_lo.rows:
+                row[status_at] = statuses[row[url_at]]
+    
+    # Count unique learning objects, and links by page, type and status for the cube
+    with pipeline_metrics.stage('summary'):
+        unique_urls = {}
+        cube_cells = {}
+        for row in all_lo.rows:
+            unique_urls.setdefault(row[-1], set()).add(row[url_at])
+            key = (row[parent_at], row[-1], status_class(row[status_at]))
+            cube_cells[key] = cube_cells.get(key, 0) + 1
+        summary = csv_tables.Table(['lo', 'n'], [[lo, len(urls)] for lo, urls in sorted(unique_urls.items())])
+    
+    with pipeline_metrics.stage('panopto_merge'):
+        panopto_rows = []
+        for row in all_lo.rows:
+            if row[-1] == 'Panopto':
+                recording = panopto_index.get(panopto_link_key(row[url_at]))
+                if recording:
+                    panopto_rows.append(row + recording)
+        panopto_joined = csv_tables.Table(all_lo.columns + ['ID', 'Name', 'Folder'], panopto_rows)
+    pipeline_metrics.count('panopto_matches', len(panopto_rows))
+    
+    with pipeline_metrics.stage('write_tables'):
+        write_csv_table(summary, 'lo_summary_table', parquet=parquet)
+        write_csv_table(all_lo, 'all_lo_table', json_page_size, parquet=parquet)
+        write_csv_table(panopto_joined, 'panopto_table', json_page_size, parquet=parquet)
+        write_cube_tables(cube_cells, parquet=parquet)
+    
+    return summary, all_lo, panopto_joined
+
+def snapshot_tables(names=DELTA_TABLES):
+    """
+    Copy the previous run's tables to PREVIOUS_TABLES_DIR before they are
+    overwritten, for compute_deltas. The tables are copied rather than moved,
+    so a run that fails after this still leaves the published tables in place.
+    """
+    os.makedirs(PREVIOUS_TABLES_DIR, exist_ok=True)
+    for name in names:
+        if os.path.exists(f'tables/{name}.csv'):
+            shutil.copy2(f'tables/{name}.csv', os.path.join(PREVIOUS_TABLES_DIR, f'{name}.csv'))
+
+def _keyed_links(path):
+    """
+    Read the columns of a table needed for its delta, indexed by a 64-bit hash
+    of URL and Parent URL and keeping the first row for each key.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [column for column in ('lo', 'Name', 'URL', 'Parent URL', 'Status Code') if column in header]
+    df = pd.read_csv(path, usecols=columns, dtype={'Status Code': 'str'})[columns]
+    df.index = pd.util.hash_pandas_object(df[['URL', 'Parent URL']], index=False).values
+    return df[~df.index.duplicated(keep='first')]
+
+def compute_table_delta(previous_file, current_file):
+    """
+    Compare two versions of a table by their links (URL and Parent URL).
+    
+    Links are matched on a hashed key, so the comparison is a single hash join
+    and runs in linear time on millions of rows.
+    
+    Args:
+        previous_file (str): The previous run's CSV table
+        current_file (str): This run's CSV table
+        
+    Returns:
+        pd.DataFrame: One row per added, removed or status-changed link, with a
+            'change' column and the 'Previous Status Code'
+    """
+    previous = _keyed_links(previous_file)
+    current = _keyed_links(current_file)
+    
+    added = current[~current.index.isin(previous.index)].assign(change='added')
+    removed = previous[~previous.index.isin(current.index)]
+    removed = removed.assign(change='removed', **{'Previous Status Code': removed['Status Code'],
+                                                   'Status Code': None})
+    both = current.join(previous['Status Code'].rename('Previous Status Code'), how='inner')
+    changed = both[both['Status Code'].fillna('') != both['Previous Status Code'].fillna('')]
+    
+    delta = pd.concat([added, removed, changed.assign(change='status changed')], ignore_index=True)
+    columns = ['change', *current.columns, 'Previous Status Code']
+    return delta.reindex(columns=columns)
+
+def compute_deltas(names=DELTA_TABLES):
+    """
+    Write tables/<name>_delta.csv (and .json) for each table with a snapshot
+    from the previous run, listing the links added, removed or with a new
+    status code since then.
+    
+    Args:
+        names (tuple): Tables to compare
+        
+    Returns:
+        dict: Table name -> delta DataFrame, for the tables that were compared
+    """
+    deltas = {}
+    for name in names:
+        previous_file = os.path.join(PREVIOUS_TABLES_DIR, f'{name}.csv')
+        if not os.path.exists(previous_file):
+            print(f"No previous {name} to compare with, skipping its delta")
+            continue
+        delta = compute_table_delta(previous_file, f'tables/{name}.csv')
+        delta.to_csv(f'tables/{name}_delta.csv', index=False)
+        write_json_table(delta, f'{name}_delta')
+        counts = delta['change'].value_counts()
+        print(f"{name}: {counts.get('added', 0)} added, {counts.get('removed', 0)} removed, "
+              f"{counts.get('status changed', 0)} status changed")
+        deltas[name] = delta
+    return deltas
+
+def _lite_keyed_links(path):
+    """
+    Read the columns of a table needed for its delta with the standard
+    library, as _keyed_links does: a dict of (URL, Parent URL) -> the first
+    row for that link, and the column names.
+    """
+    header = next(csv_tables.iter_csv(path))
+    columns = [column for column in ('lo', 'Name', 'URL', 'Parent URL', 'Status Code') if column in header]
+    table = csv_tables.read_csv(path, usecols=columns, raw=('Status Code',))
+    # Text columns come out the same whichever engine writes the delta
+    for column, value in zip(table.columns, zip(*table.rows)):
+        if column != 'Status Code' and any(v is not None and not isinstance(v, str) for v in value):
+            raise csv_tables.UnsupportedCSV(f"Column {column} of {path} is not text")
+    url_at, parent_at = table.columns.index('URL'), table.columns.index('Parent URL')
+    links = {}
+    for row in table.rows:
+        links.setdefault((row[url_at], row[parent_at]), dict(zip(table.columns, row)))
+    return links, table.columns
+
+def lite_compute_table_delta(previous_file, current_file):
+    """
+    Compare two versions of a table by their links, as compute_table_delta
+    does, with the standard library only.
+    
+    Returns:
+        csv_tables.Table: One row per added, removed or status-changed link
+    """
+    previous, _ = _lite_keyed_links(previous_file)
+    current, current_columns = _lite_keyed_links(current_file)
+    columns = ['change', *current_columns, 'Previous Status Code']
+    
+    def delta_row(change, link, status, previous_status):
+        values = dict(link, change=change, **{'Status Code': status, 'Previous Status Code': previous_status})
+        return [values.get(column) for column in columns]
+    
+    added = [delta_row('added', link, link.get('Status Code'), None)
+             for key, link in current.items() if key not in previous]
+    removed = [delta_row('removed', link, None, link.get('Status Code'))
+               for key, link in previous.items() if key not in current]
+    changed = [delta_row('status changed', link, link.get('Status Code'), previous[key].get('Status Code'))
+               for key, link in current.items()
+               if key in previous and (link.get('Status Code') or '') != (previous[key].get('Status Code') or '')]
+    return csv_tables.Table(columns, added + removed + changed)
+
+def lite_compute_deltas(names=DELTA_TABLES):
+    """
+    Write the same delta tables as compute_deltas with the standard library only.
+    
+    Returns:
+        dict: Table name -> delta csv_tables.Table, for the tables that were compared
+    """
+    deltas = {}
+    for name in names:
+        previous_file = os.path.join(PREVIOUS_TABLES_DIR, f'{name}.csv')
+        if not os.path.exists(previous_file):
+            print(f"No previous {name} to compare with, skipping its delta")
+            continue
+        delta = lite_compute_table_delta(previous_file, f'tables/{name}.csv')
+        write_csv_table(delta, f'{name}_delta')
+        counts = {}
+        for row in delta.rows:
+            counts[row[0]] = counts.get(row[0], 0) + 1
+        print(f"{name}: {counts.get('added', 0)} added, {counts.get('removed', 0)} removed, "
+              f"{counts.get('status changed', 0)} status changed")
+        deltas[name] = delta
+    return deltas
+
+def _report_date(file_name):
+    """Date of a check-links report from its file name, or None if it is not one."""
+    match = REPORT_NAME_PATTERN.search(file_name)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), '%Y-%m-%d')
+    except ValueError:
+        return None
+
+def _file_sha256(path, index):
+    """
+    SHA-256 of a file's content. The digest is remembered in index with the
+    file's size and modification time, so unchanged files are not read again.
+    """
+    stat = os.stat(path)
+    entry = index.get(path)
+    if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return entry['sha256']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    index[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest.hexdigest()}
+    return index[path]['sha256']
+
+def summarise_report(report_file, chunksize=100_000):
+    """
+    Count the learning objects in one check-links report by type and status.
+    
+    Args:
+        report_file (str): Path to the report
+        chunksize (int): Number of report rows to read at a time
+        
+    Returns:
+        dict: 'types' rows of [lo, unique URLs, links] and 'statuses' rows of
+            [lo, Status Code, links]
+    """
+    reader = pd.read_csv(
+        report_file,
+        usecols=lambda column: column in ('URL', 'Status Code'),
+        dtype={'URL': 'str', 'Status Code': 'category'},
+        chunksize=chunksize
+    )
+    unique_urls = {}
+    links = {}
+    statuses = {}
+    for chunk in reader:
+        lo = classify_learning_objects(chunk['URL'])
+        dfm = chunk[lo.notna()].assign(lo=lo.dropna())
+        for lo_type, urls in dfm.groupby('lo', observed=True)['URL']:
+            unique_urls.setdefault(lo_type, set()).update(urls)
+            links[lo_type] = links.get(lo_type, 0) + len(urls)
+        for key, n in dfm.groupby(['lo', 'Status Code'], observed=True).size().items():
+            statuses[key] = statuses.get(key, 0) + int(n)
+    return {
+        'types': [[lo_type, len(urls), links[lo_type]] for lo_type, urls in sorted(unique_urls.items())],
+        'statuses': [[lo_type, status, n] for (lo_type, status), n in sorted(statuses.items())],
+    }
+
+def lite_summarise_report(report_file, chunksize=None):
+    """
+    Count the learning objects in one check-links report as summarise_report
+    does, streaming it with the csv module. chunksize is not needed, as only
+    the counts are kept in memory.
+    """
+    rows = csv_tables.iter_csv(report_file)
+    columns = next(rows)
+    url_at, status_at = columns.index('URL'), columns.index('Status Code')
+    unique_urls = {}
+    links = {}
+    statuses = {}
+    for row in rows:
+        url = row[url_at]
+        lo = classify_url(url) if url is not None else None
+        if lo is None:
+            continue
+        unique_urls.setdefault(lo, set()).add(url)
+        links[lo] = links.get(lo, 0) + 1
+        if row[status_at] is not None:
+            statuses[lo, row[status_at]] = statuses.get((lo, row[status_at]), 0) + 1
+    return {
+        'types': [[lo_type, len(urls), links[lo_type]] for lo_type, urls in sorted(unique_urls.items())],
+        'statuses': [[lo_type, status, n] for (lo_type, status), n in sorted(statuses.items())],
+    }
+
+def find_all_reports(cache=None):
+    """
+    Find every dated check-links report, downloading the ones on GitHub that are
+    not in reports/ yet. Reports already downloaded are not requested again.
+    If GitHub cannot be reached, only the local reports are used.
+    
+    Args:
+        cache (ResponseCache): Optional response cache for the GitHub requests
+        
+    Returns:
+        dict: Report date -> path, for every report found
+    """
+    os.makedirs('reports', exist_ok=True)
+    reports = {}
+    for path in glob.glob('reports/check-links-report-*.csv'):
+        date = _report_date(path)
+        if date:
+            reports[date] = path
+    
+    try:
+        validators = _load_validators()
+        files = list_remote_reports(validators, cache)
+        _save_validators(validators)
+    except requests.exceptions.RequestException as e:
+        print(f"Error accessing GitHub, using local reports only: {str(e)}")
+        return reports
+    
+    for file in files:
+        date = _report_date(file['name'])
+        if not date or date in reports:
+            continue
+        output_path = os.path.join('reports', file['name'])
+        try:
+            download_file(RAW_URL_TEMPLATE.format(filename=file['name']), output_path, validators, cache=cache)
+            print(f"Downloaded report: {file['name']}")
+            reports[date] = output_path
+        except requests.exceptions.RequestException as e:
+            print(f"Error downloading {file['name']}, skipping it: {str(e)}")
+    return reports
+
+def process_report_history(cache=None, chunksize=100_000, engine='pandas', parquet=False):
+    """
+    Build trend tables of learning object counts from every dated report.
+    
+    Each report's counts are cached in HISTORY_DIR, keyed by a hash of the
+    report's content and of LO_TYPES, so a report is only parsed the first
+    time it is seen (or after the LO rules change). A monthly run therefore
+    only parses the new month's report.
+    
+    Writes tables/lo_trend_table (date, lo, unique URLs n, links) and
+    tables/lo_status_trend_table (date, lo, Status Code, links n) as CSV and
+    JSON, and with parquet as Parquet too.
+    
+    Args:
+        cache (ResponseCache): Optional response cache for the GitHub requests
+        chunksize (int): Number of report rows to read at a time
+        engine (str): 'pandas', or 'lite' to use the standard library only
+        parquet (bool): Also write Parquet copies of the tables
+        
+    Returns:
+        tuple: (trend_df, status_trend_df), as csv_tables.Table with the lite engine
+    """
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    os.makedirs('tables', exist_ok=True)
+    reports = find_all_reports(cache)
+    
+    index_file = os.path.join(HISTORY_DIR, 'index.json')
+    try:
+        with open(index_file, encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    rules = hashlib.sha256(json.dumps(LO_TYPES).encode('utf-8')).hexdigest()[:12]
+    
+    type_rows = []
+    status_rows = []
+    parsed = 0
+    for date in sorted(reports):
+        path = reports[date]
+        result_file = os.path.join(HISTORY_DIR, f'{_file_sha256(path, index)}-{rules}.json')
+        try:
+            with open(result_file, encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            print(f"Processing {path}")
+            with pipeline_metrics.stage('history_parse'):
+                summarise = lite_summarise_report if engine == 'lite' else summarise_report
+                result = summarise(path, chunksize)
+            with open(result_file + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(result_file + '.tmp', result_file)
+            parsed += 1
+        day = date.strftime('%Y-%m-%d')
+        type_rows.extend([day, *row] for row in result['types'])
+        status_rows.extend([day, *row] for row in result['statuses'])
+    
+    with open(index_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    print(f"History: {len(reports)} reports, {parsed} parsed, {len(reports) - parsed} from the cache")
+    pipeline_metrics.count('history_reports_parsed', parsed)
+    pipeline_metrics.count('history_reports_cached', len(reports) - parsed)
+    
+    if engine == 'lite':
+        trend = csv_tables.Table(['date', 'lo', 'n', 'links'], type_rows)
+        status_trend = csv_tables.Table(['date', 'lo', 'Status Code', 'n'], status_rows)
+        write_csv_table(trend, 'lo_trend_table', parquet=parquet)
+        write_csv_table(status_trend, 'lo_status_trend_table', parquet=parquet)
+        return trend, status_trend
+    
+    trend_df = pd.DataFrame(type_rows, columns=['date', 'lo', 'n', 'links'])
+    status_trend_df = pd.DataFrame(status_rows, columns=['date', 'lo', 'Status Code', 'n'])
+    for name, table in (('lo_trend_table', trend_df), ('lo_status_trend_table', status_trend_df)):
+        table.to_csv(f'tables/{name}.csv', index=False)
+        if parquet:
+            write_parquet_table(table, name)
+        write_json_table(table, name)
+    return trend_df, status_trend_df
+
+def parse_args():
+    """Parse the command line options of the pipeline."""
+    parser = argparse.ArgumentParser(description="Collate LibGuides learning object data.")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Stream the report in chunks of this many rows to bound memory use")
+    parser.add_argument('--json-page-size', type=int, default=None,
+                        help="Split the JSON tables for the dashboard into pages of this many rows")
+    parser.add_argument('--cache-dir', default=None,
+                        help=f"Cache GitHub responses on disk in this folder (e.g. {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--offline', action='store_true',
+                        help="Replay cached responses only, without network access (needs --cache-dir)")
+    parser.add_argument('--history', action='store_true',
+                        help="Also process every dated report, local and remote, into LO trend tables")
+    parser.add_argument('--metrics-file', default=None,
+                        help=f"Write the run's metrics to this JSON file (default: a new file in "
+                             f"{pipeline_metrics.DEFAULT_METRICS_DIR}/)")
+    parser.add_argument('--no-metrics', action='store_true', help="Do not write a metrics file")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile the run with cProfile, saved next to the metrics file")
+    parser.add_argument('--engine', choices=ENGINES, default='auto',
+                        help=f"Build the tables with the standard library ('lite') or pandas; 'auto' uses "
+                             f"lite for reports up to {LITE_MAX_BYTES // 2 ** 20} MB")
+    parser.add_argument('--parquet', action='store_true',
+                        help="Also write Parquet copies of the tables for analysis (needs pandas and pyarrow)")
+    parser.add_argument('--recheck', action='store_true',
+                        help="Re-check every learning object link and use its fresh status code")
+    parser.add_argument('--recheck-workers', type=int, default=16,
+                        help="Links re-checked at once across all hosts")
+    parser.add_argument('--recheck-per-host', type=int, default=2,
+                        help="Links re-checked at once on any one host")
+    args = parser.parse_args()
+    if args.engine == 'lite' and args.chunksize:
+        parser.error("--chunksize needs the pandas engine")
+    if args.recheck and args.offline:
+        parser.error("--recheck needs network access")
+    return args
+
+def choose_engine(args, report_file):
+    """
+    Engine for a run: the one asked for, or with 'auto' the lite engine unless
+    the report is larger than LITE_MAX_BYTES or --chunksize or --parquet is given.
+    """
+    if args.engine != 'auto':
+        return args.engine
+    if args.chunksize or args.parquet or os.path.getsize(report_file) > LITE_MAX_BYTES:
+        return 'pandas'
+    return 'lite'
+
+def require_pandas(reason):
+    """
+    Exit with a clear message if pandas is needed (for the given reason) but
+    not installed, rather than fail part-way through the run.
+    """
+    if importlib.util.find_spec('pandas') is None:
+        sys.exit(f"Error: {reason} needs pandas, which is not installed (pip install pandas)")
+
+def run_with_engine(engine, fallback, lite_function, pandas_function, *args, **kwargs):
+    """
+    Run lite_function with the lite engine and pandas_function otherwise. If
+    fallback is set, data the lite engine cannot reproduce exactly is processed
+    with pandas instead.
+    
+    Returns:
+        tuple: (result, engine used)
+    """
+    if engine == 'lite':
+        try:
+            return lite_function(*args, **kwargs), 'lite'
+        except csv_tables.UnsupportedCSV as e:
+            if not fallback:
+                raise
+            require_pandas(f"This report ({str(e)})")
+            print(f"Using pandas instead of the lite engine: {str(e)}")
+    return pandas_function(*args, **kwargs), 'pandas'
+
 def main():
     """Main function to run the data processing pipeline."""
+    args = parse_args()
+    
+    # Stage timings, request metrics and peak memory of this run, written on exit
+    pipeline_metrics.start_run('learning-object-data', profile=args.profile)
+    try:
+        run_pipeline(args)
+    finally:
+        metrics_file = args.metrics_file or pipeline_metrics.default_metrics_path('learning-object-data')
+        pipeline_metrics.finish_run(None if args.no_metrics else metrics_file)
+
+def run_pipeline(args):
+    """Run the stages of the pipeline with the parsed command line options."""
+    cache = None
+    if args.cache_dir or args.offline:
+        cache = ResponseCache(args.cache_dir or DEFAULT_CACHE_DIR, offline=args.offline)
+    
     # Download latest report
-    libguides_file, was_downloaded = download_latest_report()
+    with pipeline_metrics.stage('download_latest_report'):
+        libguides_file, was_downloaded = download_latest_report(cache=cache)
     
     if not libguides_file:
         print("Error: Could not obtain LibGuides report")
         return
     
+    engine = choose_engine(args, libguides_file)
+    fallback = args.engine == 'auto'
+    if engine == 'pandas' or args.parquet:
+        require_pandas("The pandas engine" if engine == 'pandas' else "--parquet")
+    print(f"Using the {engine} engine")
+    
+    if args.history:
+        try:
+            with pipeline_metrics.stage('history'):
+                trend_df, status_trend_df = process_report_history(cache=cache,
+                                                                   chunksize=args.chunksize or 100_000,
+                                                                   engine=engine, parquet=args.parquet)
+            print(f"Trend table shape: {trend_df.shape}")
+            print(f"Status trend table shape: {status_trend_df.shape}")
+        except Exception as e:
+            print(f"Error processing report history: {str(e)}")
+    
     # Process data if Panopto file exists
     panopto_file = 'reports/panopto_recordings.csv'
     if not os.path.exists(panopto_file):
         print(f"Error: Panopto recordings file not found at {panopto_file}")
         return
         
+    link_checker = None
+    if args.recheck:
+        link_checker = LinkChecker(max_workers=args.recheck_workers, per_host=args.recheck_per_host)
+    
     try:
-        summary_df, all_lo_df, panopto_joined_df = process_learning_objects(libguides_file, panopto_file)
-        print("\nData processing completed successfully:")
-        print(f"Summary table shape: {summary_df.shape}")
-        print(f"All LO table shape: {all_lo_df.shape}")
-        print(f"Panopto table shape: {panopto_joined_df.shape}")
+        # Keep the previous report's tables to compare the new ones with. A rerun on
+        # the same report keeps the snapshot, so its deltas are still month over month.
+        if was_downloaded:
+            snapshot_tables()
+        
+        with pipeline_metrics.stage('process'):
+            if args.chunksize:
+                summary_df, all_lo_rows, panopto_rows = stream_learning_objects(
+                    libguides_file, panopto_file, chunksize=args.chunksize, link_checker=link_checker,
+                    parquet=args.parquet)
+                print("\nData processing completed successfully:")
+                print(f"Summary table shape: {summary_df.shape}")
+                print(f"All LO table rows: {all_lo_rows}")
+                print(f"Panopto table rows: {panopto_rows}")
+            else:
+                (summary_df, all_lo_df, panopto_joined_df), engine = run_with_engine(
+                    engine, fallback, lite_process_learning_objects, process_learning_objects,
+                    libguides_file, panopto_file, json_page_size=args.json_page_size, link_checker=link_checker,
+                    parquet=args.parquet)
+                print("\nData processing completed successfully:")
+                print(f"Summary table shape: {summary_df.shape}")
+                print(f"All LO table shape: {all_lo_df.shape}")
+                print(f"Panopto table shape: {panopto_joined_df.shape}")
+        
+        print("\nChanges since the previous run:")
+        with pipeline_metrics.stage('deltas'):
+            run_with_engine(engine, fallback, lite_compute_deltas, compute_deltas)
     except Exception as e:
         print(f"Error processing data: {str(e)}")
 
@@ -0,0 +1,100 @@
+#!python3
+import time
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from http_retry import RetryingSession
+import pipeline_metrics
+
+# Sent with every check, as some sites refuse requests' default User-Agent
+USER_AGENT = 'libguides-learning-objects link checker'
+
+def link_host(url):
+    '''
+    Host (with port) that a URL is requested from, lowercased.
+    '''
+    return urlsplit(url).netloc.lower()
+
+class LinkChecker():
+    '''
+    Re-checks the status of links, a few at a time per host.
+
+    URLs are grouped by host and each host gets at most per_host lanes, each
+    checking that host's URLs one after another on a keep-alive connection of
+    its own, so no site sees more than per_host requests at once however many
+    of its links are checked. The lanes of all hosts share max_workers threads,
+    taking the hosts in turn. Each URL is checked with a HEAD request, falling
+    back to a GET (without reading the body) when the HEAD fails or is refused,
+    as some servers do not answer HEAD properly. Redirects are followed.
+
+    The status of a link is its final HTTP status code, or 'Timeout' or the
+    name of the error for a link that could not be requested. Results are
+    kept, so a URL is only checked once however often it is asked for.
+    '''
+    def __init__(self, max_workers=16, per_host=2, timeout=10.0, max_retries=1, budget=30.0):
+        self.max_workers = max(1, max_workers)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        self.results = {}
+        # Retries transient errors once; a link still failing is reported as it is
+        self.session = RetryingSession(max_retries=max_retries, backoff=0.25, budget=budget)
+        self.session.headers['User-Agent'] = USER_AGENT
+        # One pool per host, holding a connection per lane. At most max_workers hosts
+        # are checked at once, so no pool in use is evicted.
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.per_host)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def check_url(self, url):
+        '''
+        Status of one URL: HEAD, then GET if the HEAD fails or is refused.
+        '''
+        status = None
+        for method in ('HEAD', 'GET'):
+            start = time.perf_counter()
+            try:
+                with self.session.request(method, url, timeout=self.timeout, allow_redirects=True,
+                                          stream=True) as response:
+                    status = response.status_code
+            except requests.exceptions.Timeout:
+                status = 'Timeout'
+            except requests.exceptions.RequestException as e:
+                status = type(e).__name__
+            pipeline_metrics.record_request('link_check', time.perf_counter() - start, status)
+            if isinstance(status, int) and status < 400:
+                break
+        return status
+
+    def _check_lane(self, urls):
+        '''
+        Check URLs of one host from a shared queue until it is empty.
+        '''
+        while True:
+            try:
+                url = urls.popleft()
+            except IndexError:
+                return
+            self.results[url] = self.check_url(url)
+
+    def check(self, urls):
+        '''
+        Statuses of the given URLs, checking the ones not checked before.
+
+        Returns a dict of URL -> status code (int) or error name (str).
+        '''
+        urls = list(dict.fromkeys(urls))
+        by_host = {}
+        for url in urls:
+            if url not in self.results:
+                by_host.setdefault(link_host(url), deque()).append(url)
+        if by_host:
+            pipeline_metrics.count('links_rechecked', sum(map(len, by_host.values())))
+            # The first lane of every host, then the second, and so on
+            lanes = [queue for lane in range(self.per_host)
+                     for queue in by_host.values() if len(queue) > lane]
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(lanes))) as executor:
+                for lane in [executor.submit(self._check_lane, queue) for queue in lanes]:
+                    lane.result()
+        return {url: self.results[url] for url in urls}
@@ -0,0 +1,42 @@
+#!python3
+'''
+Single entry point for the pipelines:
+
+    python lo.py data [options]       learning-object-data.py
+    python lo.py panopto              panopto-client.py
+    python lo.py benchmark [options]  benchmarks/run_benchmarks.py
+
+Only the script of the command being run is loaded, so e.g. `lo.py data`
+with the lite engine never imports pandas. Options after the command are
+passed on to its script.
+'''
+import os
+import sys
+import runpy
+import argparse
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Command -> (script, description)
+COMMANDS = {
+    'data': ('learning-object-data.py', "Download the latest report and build the LO tables"),
+    'panopto': ('panopto-client.py', "Export the Panopto recordings to reports/panopto_recordings.csv"),
+    'benchmark': (os.path.join('benchmarks', 'run_benchmarks.py'), "Run the offline benchmark suite"),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="LibGuides learning objects pipelines.",
+        epilog='\n'.join(f"  {command:<10} {description}" for command, (_, description) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=COMMANDS, help="Pipeline to run")
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="Options for the command (see <command> --help)")
+    args = parser.parse_args(argv)
+
+    script = os.path.join(REPO_DIR, COMMANDS[args.command][0])
+    sys.argv = [script, *args.args]
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name='__main__')
+
+if __name__ == '__main__':
+    main()
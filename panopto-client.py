@@ -2,11 +2,31 @@ import requests
 import json
 import csv
 import os
+import functools
+import queue
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 from panopto_oauth2 import PanoptoOAuth2
+from panopto_store import PanoptoSessionStore, DEFAULT_STORE_FILE
+from http_cache import ResponseCache, DEFAULT_CACHE_DIR
+from http_retry import RetryingSession, TokenBucket
+import pipeline_metrics
+
+# Columns of the recordings CSV
+RECORDING_FIELDS = ['Name', 'ID', 'Duration', 'Folder', 'URL']
+# Columns derived from the viewers endpoint; requesting any of them turns on viewer requests
+VIEWER_FIELDS = ['Unique Viewers', 'Total Views']
+# Panopto's default page size; servers are assumed never to clamp below it
+DEFAULT_PAGE_SIZE = 50
 
 class PanoptoClient:
-    def __init__(self, server_url, client_id, client_secret, ssl_verify=True):
+    def __init__(self, server_url, client_id, client_secret, ssl_verify=True, max_workers=8, cache=None,
+                 token_provider=None, max_page_size=1000, page_workers=4, requests_per_second=None,
+                 max_retries=5, request_budget=120.0):
         self.server_url = server_url.rstrip('/')
         self.server = server_url.replace('https://', '').rstrip('/')
         self.oauth2 = PanoptoOAuth2(
@@ -15,152 +35,618 @@ class PanoptoClient:
             client_secret=client_secret,
             ssl_verify=ssl_verify
         )
-        self.access_token = None
+        # Anything with get_access_token(force_refresh=False); PanoptoOAuth2 by default
+        self.token_provider = token_provider or self.oauth2
+        # Number of concurrent viewer requests; 1 fetches viewers serially
+        self.max_workers = max(1, max_workers)
+        # Largest page size to ask for; the listings probe down from it to what the server accepts
+        self.max_page_size = max(DEFAULT_PAGE_SIZE, max_page_size)
+        # Number of session listing pages requested at once
+        self.page_workers = max(1, page_workers)
+        # Listing pages fetched while probing the page size, keyed by (folder, page size, page number)
+        self.prefetched = {}
+        self.prefetched_lock = threading.Lock()
+        # Shared keep-alive session, with a connection pool large enough for every worker.
+        # It retries throttled and failed requests, and its rate limiter is shared by all
+        # workers; requests_per_second=None leaves the pace to the server's Retry-After.
+        self.session = RetryingSession(TokenBucket(requests_per_second), max_retries=max_retries,
+                                       budget=request_budget)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers + self.page_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Optional ResponseCache to replay API responses from
+        self.cache = cache
         print(f"Initialized client for {server_url}")
 
-    def _ensure_authenticated(self):
-        if not self.access_token:
-            print("\nGetting OAuth2 access token...")
-            self.access_token = self.oauth2.get_access_token_authorization_code_grant()
-        return self.access_token
-
-    def _get_headers(self):
-        token = self._ensure_authenticated()
+    def _get_headers(self, force_refresh=False):
+        if self.cache and self.cache.offline:
+            # Replaying from the cache; no token is needed and none can be fetched
+            return {'Content-Type': 'application/json'}
+        # Looked up for every request, so tokens renewed during a long export are used
+        token = self.token_provider.get_access_token(force_refresh=force_refresh)
         return {
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
         }
+
+    def _get(self, url, params=None, kind='other'):
+        # kind labels the request type in the run's metrics, e.g. 'viewers'
+        start = time.perf_counter()
+        try:
+            response = self._send(url, self._get_headers(), params)
+            if response.status_code == 401:
+                # The token was revoked or expired early: renew it once and retry
+                response = self._send(url, self._get_headers(force_refresh=True), params)
+        except requests.exceptions.RequestException as e:
+            pipeline_metrics.record_request(kind, time.perf_counter() - start, type(e).__name__)
+            raise
+        pipeline_metrics.record_response(kind, response, time.perf_counter() - start)
+        return response
+
+    def _send(self, url, headers, params=None):
+        if self.cache:
+            return self.cache.request(self.session, 'GET', url, params=params, headers=headers, timeout=30)
+        return self.session.get(url, headers=headers, params=params, timeout=30)
+
+    def _get_viewer_summary(self, session_id):
+        # Reduce the session's viewer records to aggregate counts as soon as they
+        # arrive, so the raw lists are never kept. Failures are raised once the
+        # retries are used up, rather than exporting counts that look like zero.
+        session_endpoint = f"{self.server_url}/Panopto/api/v1/sessions/{session_id}/viewers"
+        session_response = self._get(session_endpoint, kind='viewers')
+        if session_response.status_code != 200:
+            print(f"Failed to get viewer data for session {session_id}")
+            session_response.raise_for_status()
+        return self._summarise_viewers(session_response.json())
+
+    @staticmethod
+    def _summarise_viewers(payload):
+        viewers = payload.get('Results', []) if isinstance(payload, dict) else payload
+        unique_viewers = set()
+        total_views = 0
+        for viewer in viewers or []:
+            unique_viewers.add(viewer.get('UserId') or viewer.get('Id') or viewer.get('UserName'))
+            # A record per viewer, with a view count where the API gives one
+            views = viewer.get('Views', viewer.get('ViewCount', 1))
+            total_views += views if isinstance(views, int) else 1
+        return {'Unique Viewers': len(unique_viewers), 'Total Views': total_views}
     
-    def get_folder_contents(self, folder_id):
-        print(f"\nAttempting to get contents of folder: {folder_id}")
-        headers = self._get_headers()
-    
-        endpoint = f"{self.server_url}/Panopto/api/v1/folders/{folder_id}/sessions"
-        print(f"Making request to: {endpoint}")
-    
-        all_recordings = []
+    def _get_sessions_page(self, endpoint, page_number, page_size):
+        params = {
+            'sortField': 'CreatedDate',
+            'sortOrder': 'Desc',
+            'pageNumber': page_number,
+            'pageSize': page_size
+        }
+
+        response = self._get(endpoint, params, kind='sessions_page')
+
+        if response.status_code != 200:
+            print(f"Error response content: {response.text}")
+            response.raise_for_status()
+
+        try:
+            data = response.json()
+        except json.JSONDecodeError as e:
+            print(f"JSON Decode Error: {e}")
+            print(f"Raw response text: {response.text}")
+            return None
+
+        return data.get('Results', [])
+
+    def _attach_viewer_summaries(self, executor, sessions):
+        # For each session, get its viewer counts. map() keeps the
+        # listing order however the viewer requests complete.
+        summaries = executor.map(
+            lambda session: self._get_viewer_summary(session.get('Id')),
+            sessions
+        )
+        with pipeline_metrics.stage('viewers'):
+            for session, summary in zip(sessions, summaries):
+                session['viewer_summary'] = summary
+
+    def _get_folder(self, folder_id):
+        response = self._get(f"{self.server_url}/Panopto/api/v1/folders/{folder_id}", kind='folder')
+        response.raise_for_status()
+        return response.json()
+
+    def _iter_child_folders(self, folder_id, page_size=50):
+        endpoint = f"{self.server_url}/Panopto/api/v1/folders/{folder_id}/children"
         page_number = 0
-        page_size = 50  # Fixed to Panopto's default page size
-        last_page_size = page_size
-    
         while True:
-            params = {
-                'sortField': 'CreatedDate',
-                'sortOrder': 'Desc',
-                'pageNumber': page_number,
-                'pageSize': page_size
-            }
-    
+            params = {'sortField': 'Name', 'pageNumber': page_number, 'pageSize': page_size}
+            response = self._get(endpoint, params, kind='child_folders')
+            response.raise_for_status()
+            results = response.json().get('Results', [])
+            yield from results
+            if len(results) < page_size:
+                return
+            page_number += 1
+
+    def _probe_page_size(self, folder_id):
+        # Find the largest page size the server honours, starting from max_page_size.
+        # A server either rejects a page size that is too large (400) or clamps it
+        # and returns a shorter page; a clamp is told apart from the end of a small
+        # folder by asking for the next page. Pages fetched on the way are kept for
+        # _iter_session_pages, so probing costs no extra requests.
+        endpoint = f"{self.server_url}/Panopto/api/v1/folders/{folder_id}/sessions"
+        page_size = self.max_page_size
+        while True:
             try:
-                print(f"\nRequesting page {page_number + 1}")
-                print(f"Current total recordings retrieved: {len(all_recordings)}")
-                
-                response = requests.get(
-                    endpoint,
-                    headers=headers,
-                    params=params,
-                    timeout=30
-                )
-    
-                if response.status_code != 200:
-                    print(f"Error response content: {response.text}")
-                    response.raise_for_status()
-    
-                try:
-                    data = response.json()
-                except json.JSONDecodeError as e:
-                    print(f"JSON Decode Error: {e}")
-                    print(f"Raw response text: {response.text}")
-                    break
-                
-                results = data.get('Results', [])
-                
-                if not results:
-                    print("No more recordings found in this page")
-                    break
-                
-                new_recordings = len(results)
-                print(f"Retrieved {new_recordings} recordings from page {page_number + 1}")
-                
-                # For each session, get additional details
-                for session in results:
-                    session_id = session.get('Id')
-                    # Get detailed session info including viewer data
-                    try:
-                        session_endpoint = f"{self.server_url}/Panopto/api/v1/sessions/{session_id}/viewers"
-                        session_response = requests.get(
-                            session_endpoint,
-                            headers=headers,
-                            timeout=30
-                        )
-                        if session_response.status_code == 200:
-                            viewer_data = session_response.json()
-                            session['viewer_details'] = viewer_data
-                        else:
-                            print(f"Failed to get viewer data for session {session_id}")
-                            session['viewer_details'] = []
-                    except Exception as e:
-                        print(f"Error getting viewer data for session {session_id}: {str(e)}")
-                        session['viewer_details'] = []
-                
-                all_recordings.extend(results)
-                
-                last_page_size = new_recordings
-                
-                if new_recordings < page_size:
-                    print(f"Retrieved partial page ({new_recordings} < {page_size}), reached end of results")
-                    break
-                
-                page_number += 1
-    
-            except requests.exceptions.RequestException as e:
-                print(f"Request Error: {str(e)}")
-                break
-            except Exception as e:
-                print(f"Unexpected Error: {str(e)}")
+                results = self._get_sessions_page(endpoint, 0, page_size)
                 break
-            
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 400 or page_size <= DEFAULT_PAGE_SIZE:
+                    raise
+                page_size = max(DEFAULT_PAGE_SIZE, page_size // 2)
+                print(f"Page size rejected, trying {page_size}")
+        if results is None:
+            raise ValueError(f"Could not decode page 1 of folder {folder_id}")
+
+        pages = {0: results}
+        if DEFAULT_PAGE_SIZE <= len(results) < page_size:
+            next_results = self._get_sessions_page(endpoint, 1, page_size)
+            if next_results is None:
+                raise ValueError(f"Could not decode page 2 of folder {folder_id}")
+            # Either way the first page was full at its real size
+            page_size = len(results)
+            pages[1] = next_results
+        print(f"Using page size {page_size} for folder {folder_id}")
+
+        with self.prefetched_lock:
+            for page_number, page in pages.items():
+                self.prefetched[(folder_id, page_size, page_number)] = page
+        return page_size
+
+    def _fetch_session_page(self, folder_id, page_number, page_size):
+        with self.prefetched_lock:
+            results = self.prefetched.pop((folder_id, page_size, page_number), None)
+        if results is None:
+            endpoint = f"{self.server_url}/Panopto/api/v1/folders/{folder_id}/sessions"
+            results = self._get_sessions_page(endpoint, page_number, page_size)
+            if results is None:
+                raise ValueError(f"Could not decode page {page_number + 1} of folder {folder_id}")
+        return results
+
+    def _iter_session_pages(self, folder_id, start_page=0, page_size=None, page_workers=None):
+        # Yield (page_number, sessions) in listing order. Up to page_workers pages
+        # are requested ahead, since the end of the listing is only known from a
+        # short page; the few requests made past the end come back empty. Sessions
+        # already seen are dropped, in case the listing shifts during the crawl.
+        # Pages of the folder prefetched by a probe are dropped once it ends.
+        if page_size is None:
+            page_size = self._probe_page_size(folder_id)
+        page_workers = page_workers or self.page_workers
+        seen = set()
+        with ThreadPoolExecutor(max_workers=page_workers) as executor:
+            pending = deque()
+            next_page = start_page
+            # Set once a page known to be the last has been requested
+            last_requested = False
+            try:
+                while True:
+                    while len(pending) < page_workers and not last_requested:
+                        with self.prefetched_lock:
+                            known = self.prefetched.get((folder_id, page_size, next_page))
+                        last_requested = known is not None and len(known) < page_size
+                        pending.append((next_page, executor.submit(
+                            self._fetch_session_page, folder_id, next_page, page_size)))
+                        next_page += 1
+                    page_number, future = pending.popleft()
+                    results = future.result()
+                    if not results:
+                        print("No more recordings found in this page")
+                        return
+                    new_results = [session for session in results if session.get('Id') not in seen]
+                    seen.update(session.get('Id') for session in new_results)
+                    if len(new_results) < len(results):
+                        print(f"Skipped {len(results) - len(new_results)} recordings already retrieved")
+                    print(f"Retrieved {len(results)} recordings from page {page_number + 1}")
+                    pipeline_metrics.count('session_pages')
+                    pipeline_metrics.count('sessions', len(new_results))
+                    yield page_number, new_results
+                    if len(results) < page_size:
+                        print(f"Retrieved partial page ({len(results)} < {page_size}), reached end of results")
+                        return
+            finally:
+                for _, future in pending:
+                    future.cancel()
+                with self.prefetched_lock:
+                    for key in [key for key in self.prefetched if key[0] == folder_id]:
+                        del self.prefetched[key]
+
+    def iter_folder_contents(self, folder_id, start_page=0, page_size=None, include_viewers=False):
+        """
+        Yield (page_number, sessions) for each page of a folder, newest first.
+        Without a page_size, the largest one the server accepts is probed for.
+        Pages are requested page_workers at a time ahead of the caller but yielded
+        in order, and each session only once. With include_viewers, each
+        session also gets a 'viewer_summary' of its unique viewers and total views,
+        at the cost of one viewers request per session; otherwise only the pages
+        are requested. Request errors are raised, leaving the caller to decide
+        what to keep.
+        """
+        print(f"\nAttempting to get contents of folder: {folder_id}")
+        print(f"Making request to: {self.server_url}/Panopto/api/v1/folders/{folder_id}/sessions")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for page_number, results in self._iter_session_pages(folder_id, start_page, page_size):
+                if include_viewers:
+                    self._attach_viewer_summaries(executor, results)
+                yield page_number, results
+
+    def get_folder_contents(self, folder_id, include_viewers=False):
+        # Errors are raised after the retries, so a partial listing is never returned
+        all_recordings = []
+        try:
+            for _, results in self.iter_folder_contents(folder_id, include_viewers=include_viewers):
+                all_recordings.extend(results)
+                print(f"Current total recordings retrieved: {len(all_recordings)}")
+        except requests.exceptions.RequestException as e:
+            print(f"Request Error after {len(all_recordings)} recordings: {str(e)}")
+            raise
+        except Exception as e:
+            print(f"Unexpected Error after {len(all_recordings)} recordings: {str(e)}")
+            raise
+
         print(f"\nSuccessfully retrieved {len(all_recordings)} total recordings")
         return all_recordings
 
-    def export_recordings_to_csv(self, folder_id, output_file):
+    def sync_folder(self, folder_id, store, full=False, include_viewers=False):
+        """
+        Bring the local session store up to date with a folder.
+
+        The listing is sorted newest first, so an incremental sync stops paging at
+        the first page holding a session that is already stored and unchanged. A
+        full sync walks every page, refreshes changed sessions and removes deleted
+        ones. With include_viewers, an incremental sync requests viewer counts for
+        new or changed sessions only, and a full sync refreshes them for every
+        session, since the counts change without the listing metadata changing.
+        """
+        print(f"\nSyncing folder {folder_id} with {store.path} ({'full' if full else 'incremental'})")
+
+        changed_sessions = []
+        listing_ids = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # An incremental sync usually stops on the first page, so it does not probe for
+            # a large page size or request pages ahead
+            for _, results in self._iter_session_pages(folder_id, page_size=None if full else DEFAULT_PAGE_SIZE,
+                                                       page_workers=None if full else 1):
+                listing_ids.extend(session.get('Id') for session in results)
+                changed = [session for session in results if not store.is_unchanged(session)]
+                print(f"Retrieved {len(results)} recordings, {len(changed)} new or changed")
+
+                if include_viewers:
+                    refreshed = results if full else changed
+                    self._attach_viewer_summaries(executor, refreshed)
+                    changed_sessions.extend(refreshed)
+                else:
+                    changed_sessions.extend(changed)
+
+                if not full and len(changed) < len(results):
+                    print("Reached sessions already in the store")
+                    break
+
+        store.save_sessions(folder_id, changed_sessions, listing_ids if full else None)
+        print(f"Stored {len(changed_sessions)} new, changed or refreshed recordings")
+        return changed_sessions
+
+    def crawl_folder_tree(self, root_folder_id, folder_workers=4, queue_size=16, include_viewers=False):
+        """
+        Crawl a folder and all of its descendants, yielding pages of sessions.
+
+        Folder listing, session paging and viewer fetches run as a pipeline:
+        folder_workers threads each take a folder from the folder queue, queue its
+        child folders and put its pages of sessions on a bounded page queue; with
+        include_viewers, a viewer stage submits a viewer request for every session
+        to one executor of max_workers threads, without waiting for a page to finish
+        before starting the next, and a page goes on the bounded result queue, which
+        this generator drains, once its last viewer summary arrives. Without it,
+        pages go straight to the result queue. The bounded queues (and a limit of
+        queue_size pages awaiting viewers) stop the listing from running far ahead
+        of the viewer fetches. If the generator is closed early or a request fails,
+        every stage stops rather than wait on a queue nobody drains, and viewer
+        requests still queued are cancelled. Pages arrive in the order they
+        are completed, and each session gets a 'FolderPath' of folder names from
+        the root.
+        """
+        print(f"\nCrawling folder tree from {root_folder_id} with {folder_workers} folder workers")
+        root_name = self._get_folder(root_folder_id).get('Name') or root_folder_id
+
+        folders = queue.Queue()
+        results = queue.Queue(maxsize=queue_size)
+        pages = queue.Queue(maxsize=queue_size) if include_viewers else results
+        lock = threading.Lock()
+        # Set when the crawl fails or the caller stops reading, so every stage winds down
+        stop = threading.Event()
+        # Folders queued or being listed; the crawl is finished when it reaches zero
+        pending = [1]
+        errors = []
+        folders.put((root_folder_id, root_name))
+
+        def put(q, item):
+            # Wait for room, unless the crawl is stopped
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(q):
+            # Wait for an item, or None once the crawl is stopped
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return None
+
+        def folder_worker():
+            while True:
+                item = get(folders)
+                if item is None:
+                    return
+                folder_id, folder_path = item
+                try:
+                    for child in self._iter_child_folders(folder_id):
+                        with lock:
+                            pending[0] += 1
+                        folders.put((child['Id'], f"{folder_path}/{child.get('Name', child['Id'])}"))
+                    for _, page in self._iter_session_pages(folder_id):
+                        for session in page:
+                            session['FolderPath'] = folder_path
+                        if not put(pages, page):
+                            break
+                    print(f"Listed folder {folder_path}")
+                except Exception as e:
+                    print(f"Error crawling folder {folder_path}: {str(e)}")
+                    errors.append(e)
+                    stop.set()
+                finally:
+                    with lock:
+                        pending[0] -= 1
+                        finished = pending[0] == 0
+                    if finished:
+                        for _ in range(folder_workers):
+                            folders.put(None)
+                        put(pages, None)
+
+        # Pages waiting for their viewer summaries
+        waiting = threading.Semaphore(queue_size)
+
+        def get_viewer_summary(session_id):
+            # Viewer requests still queued when the crawl stops are not sent
+            if stop.is_set():
+                return None
+            return self._get_viewer_summary(session_id)
+
+        def viewer_done(page, session, remaining, future):
+            if future.cancelled():
+                return
+            try:
+                session['viewer_summary'] = future.result()
+            except Exception as e:
+                print(f"Error getting viewer data: {str(e)}")
+                errors.append(e)
+                stop.set()
+            with lock:
+                remaining[0] -= 1
+                complete = remaining[0] == 0
+            if complete:
+                waiting.release()
+                put(results, page)
+
+        def viewer_worker():
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            try:
+                while True:
+                    page = get(pages)
+                    if page is None:
+                        break
+                    while not waiting.acquire(timeout=0.1):
+                        if stop.is_set():
+                            break
+                    if stop.is_set():
+                        break
+                    if not page:
+                        waiting.release()
+                        put(results, page)
+                        continue
+                    remaining = [len(page)]
+                    for session in page:
+                        future = executor.submit(get_viewer_summary, session.get('Id'))
+                        future.add_done_callback(functools.partial(viewer_done, page, session, remaining))
+            finally:
+                # A stopped crawl cancels the queued viewer requests and does not wait
+                # for the few in flight; otherwise every request completes first
+                stopped = stop.is_set()
+                executor.shutdown(wait=not stopped, cancel_futures=stopped)
+            # Every page has been passed on, unless the crawl was stopped
+            put(results, None)
+
+        threads = [threading.Thread(target=folder_worker, daemon=True) for _ in range(folder_workers)]
+        if include_viewers:
+            threads.append(threading.Thread(target=viewer_worker, daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                page = get(results)
+                if page is None:
+                    break
+                yield page
+        finally:
+            # Also reached when the caller closes the generator early
+            stop.set()
+
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def _recording_row(self, recording):
+        duration_secs = recording.get('Duration', 0)
+        hours = int(duration_secs // 3600)
+        minutes = int((duration_secs % 3600) // 60)
+        seconds = int(duration_secs % 60)
+        duration = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        
+        recording_url = f"{self.server_url}/Panopto/Pages/Viewer.aspx?id={recording['Id']}"
+        
+        row = {
+            'Name': recording.get('Name', ''),
+            'ID': recording.get('Id', ''),
+            'Duration': duration,
+            'Folder': recording.get('Folder', ''),
+            'URL': recording_url
+        }
+        row.update(recording.get('viewer_summary') or {})
+        return row
+
+    @staticmethod
+    def _wants_viewers(fieldnames):
+        return any(field in VIEWER_FIELDS for field in fieldnames)
+
+    def export_folder_tree_to_csv(self, root_folder_id, output_file, folder_workers=4, fields=None):
+        print(f"\nStarting folder tree export to {output_file}")
+        fieldnames = list(fields or RECORDING_FIELDS)
+        if 'Folder Path' not in fieldnames:
+            fieldnames.insert(fieldnames.index('URL') if 'URL' in fieldnames else len(fieldnames), 'Folder Path')
+        total = 0
+        # Written to a .part file, which replaces the output only once the crawl is complete
+        part_file = output_file + '.part'
+        with open(part_file, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            for page in self.crawl_folder_tree(root_folder_id, folder_workers=folder_workers,
+                                               include_viewers=self._wants_viewers(fieldnames)):
+                for recording in page:
+                    row = self._recording_row(recording)
+                    row['Folder Path'] = recording.get('FolderPath', '')
+                    writer.writerow(row)
+                total += len(page)
+        if not total:
+            os.remove(part_file)
+            print("No recordings found in the folder tree")
+            return total
+        os.replace(part_file, output_file)
+        print(f"Successfully exported {total} recordings to {output_file}")
+        return total
+
+    def _load_checkpoint(self, checkpoint_file, folder_id):
+        try:
+            with open(checkpoint_file, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if checkpoint.get('folder_id') != folder_id:
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint_file, checkpoint):
+        with open(checkpoint_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+    def _export_pages_to_csv(self, folder_id, output_file, fieldnames, resume=True):
+        """
+        Write a folder's recordings to CSV page by page as they are fetched.
+
+        Rows go to <output_file>.part, which replaces the output only once the
+        export is complete, so an interrupted export never leaves a truncated
+        catalog behind; a folder with no recordings leaves the output as it was.
+        After each page the rows are flushed to disk and a checkpoint is saved
+        (<output_file>.checkpoint) with the next page number, the page size and
+        the size of the .part file. If the export is interrupted, the next call
+        truncates any rows written after the checkpoint and carries on from that
+        page, as long as the columns are the same. Sessions added to the folder
+        in between shift the pages, so a resumed export can repeat a few rows;
+        the checkpoint is removed once complete.
+        """
+        part_file = output_file + '.part'
+        checkpoint_file = output_file + '.checkpoint'
+        checkpoint = self._load_checkpoint(checkpoint_file, folder_id) if resume else None
+
+        if (checkpoint and checkpoint.get('page_size')
+                and checkpoint.get('fields', RECORDING_FIELDS) == fieldnames and os.path.exists(part_file)):
+            print(f"Resuming export from page {checkpoint['next_page'] + 1} ({checkpoint['rows']} recordings written)")
+            csvfile = open(part_file, 'r+', newline='', encoding='utf-8')
+            csvfile.truncate(checkpoint['offset'])
+            csvfile.seek(checkpoint['offset'])
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+            # Page numbers only line up with the page size the export started with
+            page_size = checkpoint['page_size']
+            start_page, total = checkpoint['next_page'], checkpoint['rows']
+        else:
+            csvfile = open(part_file, 'w', newline='', encoding='utf-8')
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            page_size = self._probe_page_size(folder_id)
+            start_page, total = 0, 0
+
+        with csvfile:
+            for page_number, results in self.iter_folder_contents(folder_id, start_page, page_size,
+                                                                  include_viewers=self._wants_viewers(fieldnames)):
+                for recording in results:
+                    writer.writerow(self._recording_row(recording))
+                csvfile.flush()
+                os.fsync(csvfile.fileno())
+                total += len(results)
+                self._save_checkpoint(checkpoint_file, {
+                    'folder_id': folder_id,
+                    'next_page': page_number + 1,
+                    'page_size': page_size,
+                    'fields': fieldnames,
+                    'rows': total,
+                    'offset': csvfile.tell(),
+                })
+                print(f"Wrote {total} recordings so far")
+
+        if total:
+            os.replace(part_file, output_file)
+        else:
+            os.remove(part_file)
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
+        return total
+
+    def export_recordings_to_csv(self, folder_id, output_file, store=None, full_sync=False, resume=True,
+                                 fields=None):
         print(f"\nStarting export to {output_file}")
+        # Viewer requests are only made if a viewer column is asked for
+        fieldnames = list(fields or RECORDING_FIELDS)
         try:
-            recordings = self.get_folder_contents(folder_id)
+            if store is None:
+                # Stream rows to the CSV as pages arrive, resuming an interrupted export
+                total = self._export_pages_to_csv(folder_id, output_file, fieldnames, resume=resume)
+                if not total:
+                    print("No recordings found in the folder")
+                    return
+                print(f"Successfully exported {total} recordings to {output_file}")
+                return
+
+            # Incremental mode: update the store, then rebuild the CSV from it
+            self.sync_folder(folder_id, store, full=full_sync, include_viewers=self._wants_viewers(fieldnames))
+            recordings = store.get_sessions(folder_id)
             
             if not recordings:
                 print("No recordings found in the folder")
                 return
             
-            fieldnames = [
-                'Name',
-                'ID',
-                'Duration',
-                'Folder',
-                'URL'
-            ]
-            
             print(f"Writing {len(recordings)} recordings to CSV...")
-            with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            # Written to a .part file, which replaces the output only once complete
+            part_file = output_file + '.part'
+            with open(part_file, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
                 writer.writeheader()
                 
                 for recording in recordings:
-                    duration_secs = recording.get('Duration', 0)
-                    hours = int(duration_secs // 3600)
-                    minutes = int((duration_secs % 3600) // 60)
-                    seconds = int(duration_secs % 60)
-                    duration = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                    
-                    recording_url = f"{self.server_url}/Panopto/Pages/Viewer.aspx?id={recording['Id']}"
-                    
-                    writer.writerow({
-                        'Name': recording.get('Name', ''),
-                        'ID': recording.get('Id', ''),
-                        'Duration': duration,
-                        'Folder': recording.get('Folder', ''),
-                        'URL': recording_url
-                    })
+                    writer.writerow(self._recording_row(recording))
+            os.replace(part_file, output_file)
             
             print(f"Successfully exported recordings to {output_file}")
             
@@ -170,23 +656,62 @@ class PanoptoClient:
 
 # Main execution block
 if __name__ == "__main__":
+    # Stage timings and request metrics of this run, written to PANOPTO_METRICS_FILE
+    # (a new file in metrics/ by default; PANOPTO_METRICS=0 turns it off).
+    # PANOPTO_PROFILE=1 also profiles the run with cProfile.
+    pipeline_metrics.start_run('panopto-client', profile=os.environ.get('PANOPTO_PROFILE') == '1')
     try:
         # Configuration
         SERVER_URL = "https://southampton.cloud.panopto.eu"
-        CLIENT_ID = os.environ['CLIENT_ID']
-        CLIENT_SECRET = os.environ['CLIENT_SECRET']
+        # Response cache: set PANOPTO_CACHE_DIR to enable it, PANOPTO_OFFLINE=1 to replay only
+        CACHE_DIR = os.environ.get('PANOPTO_CACHE_DIR')
+        OFFLINE = os.environ.get('PANOPTO_OFFLINE') == '1'
+        # Credentials are not needed to replay from the cache
+        CLIENT_ID = os.environ.get('CLIENT_ID', '') if OFFLINE else os.environ['CLIENT_ID']
+        CLIENT_SECRET = os.environ.get('CLIENT_SECRET', '') if OFFLINE else os.environ['CLIENT_SECRET']
         FOLDER_ID = "fe0aa3a2-51e5-4231-becf-1306400b593b"
         OUTPUT_FILE = "reports/panopto_recordings.csv"
+        MAX_WORKERS = int(os.environ.get('PANOPTO_MAX_WORKERS', 8))
+        # Requests per second across all workers; unset to be paced by the server's throttling
+        RATE_LIMIT = float(os.environ['PANOPTO_RATE_LIMIT']) if os.environ.get('PANOPTO_RATE_LIMIT') else None
+        # Sync mode: unset for a full crawl, 'incremental' or 'full' to use the session store
+        SYNC_MODE = os.environ.get('PANOPTO_SYNC')
+        STORE_FILE = os.environ.get('PANOPTO_STORE', DEFAULT_STORE_FILE)
+        # Set PANOPTO_RECURSIVE=1 to export the folder and all of its subfolders
+        RECURSIVE = os.environ.get('PANOPTO_RECURSIVE') == '1'
+        FOLDER_WORKERS = int(os.environ.get('PANOPTO_FOLDER_WORKERS', 4))
+        # Listing pages: the largest page size to try, and how many pages to request at once
+        MAX_PAGE_SIZE = int(os.environ.get('PANOPTO_PAGE_SIZE', 1000))
+        PAGE_WORKERS = int(os.environ.get('PANOPTO_PAGE_WORKERS', 4))
+        # Set PANOPTO_VIEWERS=1 to add viewer counts, at one extra request per recording
+        FIELDS = RECORDING_FIELDS + VIEWER_FIELDS if os.environ.get('PANOPTO_VIEWERS') == '1' else RECORDING_FIELDS
 
         # Initialize and run
         client = PanoptoClient(
             server_url=SERVER_URL,
             client_id=CLIENT_ID,
-            client_secret=CLIENT_SECRET
+            client_secret=CLIENT_SECRET,
+            max_workers=MAX_WORKERS,
+            max_page_size=MAX_PAGE_SIZE,
+            page_workers=PAGE_WORKERS,
+            requests_per_second=RATE_LIMIT,
+            cache=ResponseCache(CACHE_DIR or DEFAULT_CACHE_DIR, offline=OFFLINE) if CACHE_DIR or OFFLINE else None
         )
 
-        client.export_recordings_to_csv(FOLDER_ID, OUTPUT_FILE)
+        with pipeline_metrics.stage('export'):
+            if RECURSIVE:
+                client.export_folder_tree_to_csv(FOLDER_ID, OUTPUT_FILE, folder_workers=FOLDER_WORKERS,
+                                                 fields=FIELDS)
+            elif SYNC_MODE:
+                with PanoptoSessionStore(STORE_FILE) as store:
+                    client.export_recordings_to_csv(FOLDER_ID, OUTPUT_FILE, store=store,
+                                                    full_sync=(SYNC_MODE == 'full'), fields=FIELDS)
+            else:
+                client.export_recordings_to_csv(FOLDER_ID, OUTPUT_FILE, fields=FIELDS)
         print("Script completed successfully!")
 
     except Exception as e:
         print(f"An error occurred: {str(e)}")
+    finally:
+        METRICS_FILE = os.environ.get('PANOPTO_METRICS_FILE') or pipeline_metrics.default_metrics_path('panopto-client')
+        pipeline_metrics.finish_run(None if os.environ.get('PANOPTO_METRICS') == '0' else METRICS_FILE)
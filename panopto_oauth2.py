@@ -5,8 +5,8 @@ import json
 import requests
 from requests_oauthlib import OAuth2Session
 from oauthlib.oauth2 import LegacyApplicationClient  # specific to Resource Owner Grant
-import pickle
 import pprint
+import threading
 import webbrowser
 from http.server import BaseHTTPRequestHandler
 from socketserver import ThreadingTCPServer
@@ -18,6 +18,9 @@ REDIRECT_PORT = 9127
 # Typical scope for accessing Panopto API.
 DEFAULT_SCOPE = ('openid', 'api')
 
+# Refresh access tokens this many seconds before they expire.
+REFRESH_MARGIN = 120
+
 class PanoptoOAuth2():
     def __init__(self, server, client_id, client_secret, ssl_verify):
         self.client_id = client_id
@@ -28,18 +31,55 @@ class PanoptoOAuth2():
         self.authorization_endpoint = 'https://{0}/Panopto/oauth2/connect/authorize'.format(server)
         self.access_token_endpoint = 'https://{0}/Panopto/oauth2/connect/token'.format(server)
 
-        # Create cache file name to store the refresh token. Use server & client ID combination.
-        self.cache_file = 'token_{0}_{1}.cache'.format(server, client_id)
+        # Create cache file name to store the token as JSON. Use server & client ID combination.
+        self.cache_file = 'token_{0}_{1}.json'.format(server, client_id)
+
+        # Current token object, loaded from the cache on first use.
+        # The lock makes sure only one thread fetches or refreshes it at a time.
+        self.token = None
+        self.lock = threading.Lock()
 
         # Make oauthlib library accept non-HTTPS redirection.
         # This should not be applied if the redirect is hosted by actual server (not localhost).
         os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-    def get_access_token_authorization_code_grant(self):
+    def get_access_token(self, force_refresh=False):
+        '''
+        Get a valid access token, safe to call from many threads for every request.
+
+        The cached token is reused until REFRESH_MARGIN seconds before it expires,
+        so this is normally a lookup with no network round trip. When the token is
+        about to expire (or force_refresh is set, e.g. after a 401) the first caller
+        refreshes it while the others wait for the result.
+        '''
+        token = self.token
+        if not force_refresh and self.__is_fresh(token):
+            return token['access_token']
+
+        with self.lock:
+            # Another thread may have renewed the token while this one waited.
+            if self.token is not token and self.__is_fresh(self.token):
+                return self.token['access_token']
+            if self.token is None and not force_refresh:
+                self.token = self.__load_token_from_cache()
+                if self.__is_fresh(self.token):
+                    print('Reusing unexpired access token from {0}'.format(self.cache_file))
+                    return self.token['access_token']
+            return self.get_access_token_authorization_code_grant(use_cache=False)
+
+    def __is_fresh(self, token):
+        '''
+        Private method of the class.
+        True if the token exists and is not within REFRESH_MARGIN of expiring.
+        '''
+        return bool(token) and token.get('expires_at', 0) - REFRESH_MARGIN > time.time()
+
+    def get_access_token_authorization_code_grant(self, use_cache=True):
         '''
         Get OAuth2 access token by Authorization Code Grant (Server-side Web Application).
         
-        This method initially tries to get a new access token from refresh token.
+        This method first reuses the cached access token if it has not expired (unless
+        use_cache is False), then tries to get a new access token from refresh token.
         
         If refresh token is not available or does not work, proceed to new authorization flow:
          1. To launch the browser to navigate authorization URL.
@@ -49,12 +89,19 @@ class PanoptoOAuth2():
          5. Save the token object, which includes refersh_token, for later refrehsh operation.
         '''
         
-        # First, try getting a new access token from refesh token.
+        # First, reuse the cached access token if it is still valid.
+        if use_cache:
+            self.token = self.__load_token_from_cache()
+            if self.__is_fresh(self.token):
+                print('Reusing unexpired access token from {0}'.format(self.cache_file))
+                return self.token['access_token']
+
+        # Then, try getting a new access token from refesh token.
         access_token = self.__get_refreshed_access_token()
         if access_token:
             return access_token
 
-        # Then, fallback to the full autorization path. Offline access scope is needed to get refresh token.
+        # Finally, fallback to the full autorization path. Offline access scope is needed to get refresh token.
         scope = list(DEFAULT_SCOPE) + ['offline_access']
         session = OAuth2Session(self.client_id, scope = scope, redirect_uri = REDIRECT_URL)
         
@@ -90,10 +137,10 @@ class PanoptoOAuth2():
         Returning None if failing to get the new access token with any reason.
         '''
         try:
-            print()
-            print('Read cached token from {0}'.format(self.cache_file))
-            with open(self.cache_file, 'rb') as fr:
-                token = pickle.load(fr)
+            token = self.token or self.__load_token_from_cache()
+            if not token or 'refresh_token' not in token:
+                print('No cached refresh token in {0}'.format(self.cache_file))
+                return None
 
             session = OAuth2Session(self.client_id, token = token)
 
@@ -110,15 +157,33 @@ class PanoptoOAuth2():
             print('Failed to refresh access token: ' + str(e))
             return None
 
+    def __load_token_from_cache(self):
+        '''
+        Private method of the class.
+        Read the token object from the JSON cache file, or None if there is none.
+        '''
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as fr:
+                return json.load(fr)
+        except (OSError, ValueError):
+            return None
+
     def __save_token_to_cache(self, token):
         '''
         Private method of the class.
-        Save entire token object from oauthlib (not just refresh token).
+        Save entire token object from oauthlib (not just refresh token) as JSON,
+        readable only by the current user. The token itself is not printed.
         '''
-        with open(self.cache_file, 'wb') as fw:
-            pickle.dump(token, fw)
-        print('OAuth2 flow provided the token below. Cache it to {0}'.format(self.cache_file))
-        pprint.pprint(token, indent = 4)
+        token = dict(token)
+        if 'expires_at' not in token and 'expires_in' in token:
+            token['expires_at'] = time.time() + float(token['expires_in'])
+        self.token = token
+        tmp_file = self.cache_file + '.tmp'
+        with open(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as fw:
+            json.dump(token, fw)
+        os.replace(tmp_file, self.cache_file)
+        print('OAuth2 flow provided a token valid until {0}. Cache it to {1}'.format(
+            time.ctime(token.get('expires_at', 0)), self.cache_file))
 
     def get_access_token_resource_owner_grant(self, username, password):
         '''
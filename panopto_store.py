@@ -0,0 +1,113 @@
+#!python3
+import os
+import json
+import hashlib
+import sqlite3
+
+# Default location of the local session store, next to the exported CSV.
+DEFAULT_STORE_FILE = 'reports/panopto_sessions.db'
+
+# Session keys added by the client rather than the listing; left out of fingerprints
+CLIENT_KEYS = ('viewer_details', 'viewer_summary')
+
+class PanoptoSessionStore():
+    '''
+    Local SQLite store of Panopto sessions already seen by the client.
+
+    Each session is keyed by its ID and saved with a fingerprint of its listing
+    metadata, so a later sync can tell new and changed sessions from known ones.
+    The listing position is kept as a sequence number, which lets the export be
+    rebuilt from the store in the same order the API returns (newest first).
+    '''
+    def __init__(self, path=DEFAULT_STORE_FILE):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                folder_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL,
+                data TEXT NOT NULL
+            )''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS sessions_folder ON sessions (folder_id, seq)')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def fingerprint(session):
+        '''
+        Hash of the session's listing metadata, ignoring data added by the client.
+        '''
+        metadata = {key: value for key, value in session.items() if key not in CLIENT_KEYS}
+        encoded = json.dumps(metadata, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        return hashlib.sha1(encoded).hexdigest()
+
+    def is_unchanged(self, session):
+        '''
+        True if the session is already stored with the same listing metadata.
+        '''
+        row = self.connection.execute(
+            'SELECT fingerprint FROM sessions WHERE id = ?', (session.get('Id'),)).fetchone()
+        return row is not None and row[0] == self.fingerprint(session)
+
+    def save_sessions(self, folder_id, sessions, listing_ids=None):
+        '''
+        Insert or update sessions, given in listing order (newest first).
+
+        New sessions are numbered above every stored session, so they sort ahead
+        of them. If listing_ids holds the IDs of a complete listing of the folder,
+        every session is renumbered to match it and sessions no longer listed are
+        removed. All changes are written in a single transaction.
+        '''
+        positions = None
+        with self.connection:
+            if listing_ids is not None:
+                positions = {session_id: len(listing_ids) - i for i, session_id in enumerate(listing_ids)}
+                # The listed IDs go in a temporary table rather than one parameter
+                # each, which large folders would take past SQLite's variable limit
+                self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS seen (id TEXT PRIMARY KEY)')
+                self.connection.execute('DELETE FROM seen')
+                self.connection.executemany(
+                    'INSERT OR IGNORE INTO seen (id) VALUES (?)', [(session_id,) for session_id in listing_ids])
+                self.connection.execute(
+                    'DELETE FROM sessions WHERE folder_id = ? AND id NOT IN (SELECT id FROM seen)', (folder_id,))
+                # Renumber so that the first listed session has the highest seq
+                self.connection.executemany(
+                    'UPDATE sessions SET seq = ? WHERE id = ?',
+                    [(seq, session_id) for session_id, seq in positions.items()])
+
+            top = self.connection.execute(
+                'SELECT COALESCE(MAX(seq), 0) FROM sessions WHERE folder_id = ?', (folder_id,)).fetchone()[0]
+            for i, session in enumerate(sessions):
+                session_id = session.get('Id')
+                existing = self.connection.execute(
+                    'SELECT seq FROM sessions WHERE id = ?', (session_id,)).fetchone()
+                if positions is not None:
+                    seq = positions[session_id]
+                elif existing:
+                    seq = existing[0]
+                else:
+                    seq = top + len(sessions) - i
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO sessions (id, folder_id, seq, fingerprint, data) VALUES (?, ?, ?, ?, ?)',
+                    (session_id, folder_id, seq, self.fingerprint(session), json.dumps(session)))
+
+    def get_sessions(self, folder_id):
+        '''
+        Return the stored sessions of a folder in listing order (newest first).
+        '''
+        rows = self.connection.execute(
+            'SELECT data FROM sessions WHERE folder_id = ? ORDER BY seq DESC', (folder_id,))
+        return [json.loads(data) for (data,) in rows]
@@ -0,0 +1,245 @@
+#!python3
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Default folder for the per-run metrics files
+DEFAULT_METRICS_DIR = 'metrics'
+
+# Upper bounds in milliseconds of the request latency histogram buckets
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+def _rss_mb():
+    '''Resident set size of this process in MB, or None where /proc is unavailable.'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+class Metrics():
+    '''
+    Metrics of one pipeline run: time and peak memory per stage, counters, and
+    per request type latency histograms and bytes transferred.
+
+    Peak memory is the peak resident set size seen while a stage was open,
+    sampled by a background thread every sample_interval seconds, so it costs
+    nothing in the code being measured. Stages can nest, and a stage entered
+    several times (e.g. once per chunk) accumulates. Everything is thread-safe.
+    With profile, the thread that started the run is profiled with cProfile.
+    '''
+    def __init__(self, pipeline, profile=False, sample_interval=0.05):
+        self.pipeline = pipeline
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.open_stages = {}
+        self.counters = {}
+        self.requests = {}
+        self.peak_rss_mb = _rss_mb()
+
+        self.profiler = cProfile.Profile() if profile else None
+        if self.profiler:
+            self.profiler.enable()
+
+        self.sample_interval = sample_interval
+        self.stopped = threading.Event()
+        self.sampler = None
+        if self.peak_rss_mb is not None:
+            self.sampler = threading.Thread(target=self._sample, daemon=True)
+            self.sampler.start()
+
+    def _sample(self):
+        while not self.stopped.wait(self.sample_interval):
+            self._update_peaks(_rss_mb())
+
+    def _update_peaks(self, rss):
+        if rss is None:
+            return
+        with self.lock:
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+            for key, peak in self.open_stages.items():
+                self.open_stages[key] = max(peak, rss)
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        Time a stage and record the peak memory while it runs.
+        '''
+        key = object()
+        rss = _rss_mb()
+        with self.lock:
+            self.open_stages[key] = rss
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._update_peaks(_rss_mb())
+            with self.lock:
+                peak = self.open_stages.pop(key)
+                entry = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_rss_mb': None})
+                entry['calls'] += 1
+                entry['seconds'] += seconds
+                if peak is not None:
+                    entry['peak_rss_mb'] = max(entry['peak_rss_mb'] or 0.0, peak)
+
+    def count(self, name, n=1):
+        '''
+        Add n to a counter.
+        '''
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_request(self, kind, seconds, status=None, nbytes=0, cached=False):
+        '''
+        Record one request of a given kind: its latency, status and body size.
+        '''
+        milliseconds = seconds * 1000
+        bucket = next((str(bound) for bound in LATENCY_BUCKETS_MS if milliseconds <= bound), 'inf')
+        with self.lock:
+            entry = self.requests.setdefault(kind, {
+                'count': 0, 'cached': 0, 'seconds': 0.0, 'min_ms': None, 'max_ms': 0.0,
+                'bytes': 0, 'statuses': {},
+                # Request counts by latency bucket, keyed by the bucket's upper bound
+                'latency_ms': {str(bound): 0 for bound in LATENCY_BUCKETS_MS + ('inf',)},
+            })
+            entry['count'] += 1
+            entry['cached'] += bool(cached)
+            entry['seconds'] += seconds
+            entry['min_ms'] = milliseconds if entry['min_ms'] is None else min(entry['min_ms'], milliseconds)
+            entry['max_ms'] = max(entry['max_ms'], milliseconds)
+            entry['bytes'] += nbytes
+            status = str(status)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            entry['latency_ms'][bucket] += 1
+
+    def finish(self, path=None):
+        '''
+        Stop sampling and profiling, and write the metrics as JSON to path if given.
+        The profile is saved next to it as <path>.prof, with the top functions by
+        cumulative time included in the JSON.
+
+        Returns the metrics as a dict.
+        '''
+        self.stopped.set()
+        if self.sampler:
+            self.sampler.join()
+        self._update_peaks(_rss_mb())
+        metrics = {
+            'pipeline': self.pipeline,
+            'started_at': self.started_at,
+            'seconds': time.perf_counter() - self.start,
+            'peak_rss_mb': self.peak_rss_mb,
+            'stages': self.stages,
+            'counters': self.counters,
+            'requests': self.requests,
+        }
+
+        if self.profiler:
+            self.profiler.disable()
+            stats = pstats.Stats(self.profiler)
+            if path:
+                stats.dump_stats(path + '.prof')
+                metrics['profile'] = path + '.prof'
+            top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:25]
+            metrics['profile_top'] = [
+                {'function': f'{file_name}:{line}({function})', 'calls': calls, 'cumulative_seconds': cumulative}
+                for (file_name, line, function), (_, calls, _, cumulative, _) in top
+            ]
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(metrics, f, indent=2)
+            print(f"Metrics written to {path}")
+        return metrics
+
+# The run being measured, if any. The module-level functions below are no-ops
+# without one, so instrumented code runs unchanged when nothing is collecting.
+_current = None
+
+def start_run(pipeline, profile=False):
+    '''
+    Start collecting metrics for a run of a pipeline, replacing any current run.
+    '''
+    global _current
+    _current = Metrics(pipeline, profile=profile)
+    return _current
+
+def finish_run(path=None):
+    '''
+    Finish the current run and write its metrics to path. Returns the metrics,
+    or None if no run was started.
+    '''
+    global _current
+    run, _current = _current, None
+    return run.finish(path) if run else None
+
+def default_metrics_path(pipeline, directory=DEFAULT_METRICS_DIR):
+    '''
+    Path of a new metrics file for a run: <directory>/<pipeline>-<timestamp>.json
+    '''
+    return os.path.join(directory, f"{pipeline}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+
+@contextmanager
+def stage(name):
+    '''
+    Time a stage of the current run.
+    '''
+    run = _current
+    if run is None:
+        yield
+        return
+    with run.stage(name):
+        yield
+
+def count(name, n=1):
+    '''
+    Add n to a counter of the current run.
+    '''
+    run = _current
+    if run is not None:
+        run.count(name, n)
+
+def record_request(kind, seconds, status=None, nbytes=0, cached=False):
+    '''
+    Record a request in the current run.
+    '''
+    run = _current
+    if run is not None:
+        run.record_request(kind, seconds, status, nbytes, cached)
+
+def record_response(kind, response, seconds, nbytes=None):
+    '''
+    Record a requests.Response in the current run. The body size is taken from
+    the content unless nbytes is given, as it must be for streamed responses.
+    '''
+    run = _current
+    if run is None:
+        return
+    if nbytes is None:
+        nbytes = len(response.content)
+    run.record_request(kind, seconds, response.status_code, nbytes, getattr(response, 'from_cache', False))
+
+def timed_iter(name, iterable):
+    '''
+    Yield the items of an iterable, timing each step as a stage of the current
+    run, e.g. the reading of each chunk of a CSV.
+    '''
+    iterator = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item